@@ -2,7 +2,6 @@ import streamlit as st
 import os
 import sys
 import io
-from PIL import Image
 
 # Add backend to path for imports
 backend_path = os.path.join(os.path.dirname(__file__), "backend")
@@ -10,7 +9,7 @@ if backend_path not in sys.path:
     sys.path.append(backend_path)
 
 try:
-    from ensemble_model import predict_image
+    from diagnosis import predict_image
     from database import init_db, get_history
 except ImportError as e:
     st.error(f"Failed to import core logic: {e}")
@@ -109,18 +108,13 @@ with col1:
     uploaded_file = st.file_uploader("Upload Image (X-Ray, CT, MRI)", type=["jpg", "jpeg", "png"])
     
     if uploaded_file:
-        image = Image.open(uploaded_file)
-        st.image(image, use_container_width=True, caption="Target Scan Preview")
+        img_bytes = uploaded_file.getvalue()
+        st.image(img_bytes, use_container_width=True, caption="Target Scan Preview")
         
         if st.button("Execute Ensemble Scan"):
             with st.spinner("Analyzing neural patterns..."):
-                # Convert to bytes for predict_image
-                img_byte_arr = io.BytesIO()
-                image.save(img_byte_arr, format='PNG')
-                img_byte_arr = img_byte_arr.getvalue()
-                
-                # Run Prediction
-                result = predict_image(io.BytesIO(img_byte_arr))
+                # Original upload bytes are analyzed directly; no PNG re-encode
+                result = predict_image(io.BytesIO(img_bytes))
                 st.session_state.result = result
                 st.session_state.analysis_done = True
     st.markdown('</div>', unsafe_allow_html=True)
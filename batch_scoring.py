@@ -0,0 +1,181 @@
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+MAX_BATCH_BYTES = int(os.environ.get("MAX_BATCH_BYTES", str(1024 * 1024 * 1024)))
+# Total decompressed size allowed per archive, so a small zip cannot inflate without bound
+MAX_BATCH_EXPANDED_BYTES = int(os.environ.get("MAX_BATCH_EXPANDED_BYTES", str(4 * 1024 * 1024 * 1024)))
+
+
+def is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def spool_upload(source, max_bytes):
+    """Copies a file object to an anonymous temp file in chunks, enforcing a byte budget."""
+    from ingestion import UploadTooLarge, UPLOAD_CHUNK_BYTES
+    spool = tempfile.TemporaryFile()
+    total = 0
+    while True:
+        chunk = source.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            spool.close()
+            raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def iter_zip_images(source, max_entry_bytes, max_total_bytes=MAX_BATCH_EXPANDED_BYTES):
+    """Yields (name, bytes or IngestionError) for every image entry in a zip archive.
+
+    `source` is bytes or a seekable file; entries are decompressed one at a time as the
+    generator advances. Sizes are enforced on the bytes actually inflated rather than
+    the (forgeable) header sizes, and the archive stops once `max_total_bytes` expand.
+    """
+    from ingestion import UploadTooLarge
+    expanded = 0
+    with zipfile.ZipFile(source if hasattr(source, "read") else io.BytesIO(source)) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not is_image_name(info.filename):
+                continue
+            if info.file_size > max_entry_bytes:
+                yield info.filename, UploadTooLarge(f"Upload exceeds the {max_entry_bytes} byte limit")
+                continue
+            with archive.open(info) as entry:
+                data = entry.read(max_entry_bytes + 1)
+            if len(data) > max_entry_bytes:
+                yield info.filename, UploadTooLarge(f"Upload exceeds the {max_entry_bytes} byte limit")
+                continue
+            expanded += len(data)
+            if expanded > max_total_bytes:
+                yield info.filename, UploadTooLarge(f"Archive expands beyond the {max_total_bytes} byte limit")
+                return
+            yield info.filename, data
+
+
+def iter_image_files(root):
+    # Sorted walk so runs over the same archive are reproducible and resumable
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if is_image_name(name):
+                yield os.path.relpath(os.path.join(dirpath, name), root)
+
+
+def truncate_partial_line(output_path, block=64 * 1024):
+    # A crash mid-write leaves an unterminated last line; cut back to the last newline before appending
+    if not os.path.isfile(output_path):
+        return 0
+    with open(output_path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            start = max(0, pos - block)
+            f.seek(start)
+            newline = f.read(pos - start).rfind(b"\n")
+            if newline >= 0:
+                pos = start + newline + 1
+                break
+            pos = start
+        if pos < end:
+            f.truncate(pos)
+    return end - pos
+
+
+def load_completed(output_path):
+    # Every line already in the NDJSON output is a finished image; skip it on resume
+    completed = set()
+    if os.path.isfile(output_path):
+        with open(output_path) as f:
+            for line in f:
+                try:
+                    completed.add(json.loads(line)["filename"])
+                except (ValueError, KeyError):
+                    continue
+    return completed
+
+
+def score_file(root, relpath):
+    # Runs in a worker process; imports are deferred so the parent stays lightweight
+    from diagnosis import predict_image
+    with open(os.path.join(root, relpath), "rb") as f:
+        return relpath, predict_image(io.BytesIO(f.read()))
+
+
+def _history_record(relpath, result):
+    return {
+        "modality": result['modality'],
+        "condition": result['condition'],
+        "confidence": result['confidence'],
+        "report": result['report'],
+        "filename": relpath,
+    }
+
+
+def score_folder(root, output_path, workers=None, history=True, history_batch=256, chunksize=8):
+    """Scores every image under `root` with predict_image across a process pool.
+
+    Results are appended to `output_path` as NDJSON, which doubles as the resume log.
+    Output lines and bulk history inserts are flushed together every `history_batch` results.
+    """
+    from database import init_db, save_diagnoses
+
+    dropped = truncate_partial_line(output_path)
+    if dropped:
+        print(f"Dropped {dropped} bytes of an incomplete last line in {output_path}")
+    completed = load_completed(output_path)
+    pending = [p for p in iter_image_files(root) if p not in completed]
+    print(f"{len(completed)} already scored, {len(pending)} remaining under {root}")
+    if history:
+        init_db()
+
+    started = time.perf_counter()
+    lines, records = [], []
+    scored = 0
+
+    def flush(out):
+        # History commits before the resume log, so a crash re-scores rather than drops rows
+        if history and records:
+            save_diagnoses(records)
+        out.writelines(lines)
+        out.flush()
+        lines.clear()
+        records.clear()
+
+    with open(output_path, "a") as out, ProcessPoolExecutor(max_workers=workers) as pool:
+        roots = [root] * len(pending)
+        for relpath, result in pool.map(score_file, roots, pending, chunksize=chunksize):
+            lines.append(json.dumps({"filename": relpath, **result}) + "\n")
+            records.append(_history_record(relpath, result))
+            scored += 1
+            if len(lines) >= history_batch:
+                flush(out)
+            if scored % 100 == 0:
+                rate = scored / (time.perf_counter() - started) * 3600
+                print(f"Scored {scored}/{len(pending)} ({rate:.0f} images/hour)")
+        flush(out)
+
+    elapsed = time.perf_counter() - started
+    print(f"Scored {scored} images in {elapsed:.1f}s")
+    return scored
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score every image in a study folder with the diagnosis pipeline.")
+    parser.add_argument("folder", help="Root directory to walk for .png/.jpg/.jpeg images")
+    parser.add_argument("--output", default="batch_results.ndjson", help="NDJSON results file (also used to resume)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--no-history", action="store_true", help="Do not write results to diagnosis_history")
+    parser.add_argument("--history-batch", type=int, default=256)
+    args = parser.parse_args()
+    score_folder(args.folder, args.output, args.workers, not args.no_history, args.history_batch)
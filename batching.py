@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+
+# Micro-batching window: flush after BATCH_MAX_WAIT_MS or once BATCH_MAX_SIZE images are queued
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """Collects concurrent submissions and runs them through `process_fn` as one batch.
+
+    `process_fn(items)` receives a list of submitted items and must return a list of
+    results in the same order. Each caller gets back `(result, stats)`.
+    """
+
+    def __init__(self, process_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.process_fn = process_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = None
+        self._worker = None
+
+    async def submit(self, item):
+        # Queue and worker are bound to the running loop, so create them lazily
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            items = [entry[0] for entry in batch]
+            started = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(None, self.process_fn, items)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            inference_s = time.perf_counter() - started
+            for (_, future, enqueued), result in zip(batch, results):
+                stats = {
+                    "batch_size": len(batch),
+                    "queue_ms": (started - enqueued) * 1000.0,
+                    "inference_ms": inference_s * 1000.0,
+                    "throughput_ips": len(batch) / inference_s if inference_s > 0 else 0.0,
+                }
+                if not future.done():
+                    future.set_result((result, stats))
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one computation.
+
+    The first caller for a key starts `fn()` as a task; callers arriving while it is
+    in flight await the same task. Each caller gets back `(result, coalesced)`. The
+    task is shielded, so a caller disconnecting does not cancel the shared work.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(self, key, fn):
+        task = self._inflight.get(key)
+        coalesced = task is not None
+        if coalesced:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task), coalesced
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "leaders": self.leaders, "coalesced": self.coalesced}
@@ -0,0 +1,34 @@
+import argparse
+
+from harness import emit, time_calls
+
+import database
+from testutils import temporary_database
+
+REPORT = {
+    "clinical_findings": ["Evaluation demonstrates normal characteristics.", "Normal anatomical patterns observed."],
+    "impression": "Normal diagnostic study. No acute findings.",
+    "severity": "Normal",
+    "recommendation": "Follow-up as per standard clinical screening guidelines.",
+}
+
+
+def run(repeats=200, bulk_size=100):
+    with temporary_database("bench.db"):
+        record = {"modality": "Chest X-ray", "condition": "Normal", "confidence": 0.93, "report": REPORT, "filename": "bench.png"}
+        results = {
+            "save_diagnosis": time_calls(lambda: database.save_diagnosis(**record), repeats),
+            "save_diagnoses_bulk": time_calls(lambda: database.save_diagnoses([record] * bulk_size), max(1, repeats // 10), items_per_call=bulk_size),
+            "get_clinical_knowledge": time_calls(lambda: database.get_clinical_knowledge("Pneumonia"), repeats),
+            "get_history": time_calls(lambda: database.get_history(), repeats),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite calls in database.py.")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--bulk-size", type=int, default=100)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    emit("database", run(args.repeats, args.bulk_size), args.output)
@@ -0,0 +1,37 @@
+import argparse
+
+import torch
+
+from harness import emit, time_calls
+
+from model_registry import ModalityEnsemble, SharedBackbones
+from uncertainty import VIEW_TRANSFORMS, summarize_views, tta_views
+
+BATCH_SIZES = [1, 2, 4, 8, 16, 32]
+TTA_VIEWS = 4
+
+
+def run(batch_sizes=BATCH_SIZES, repeats=3):
+    # Untrained weights: forward cost does not depend on the values, and no download is needed
+    ensemble = ModalityEnsemble(SharedBackbones(pretrained=False), num_classes=8)
+    results = {}
+    for batch_size in batch_sizes:
+        x = torch.randn(batch_size, 3, 224, 224)
+        results[f"batch_{batch_size}"] = time_calls(lambda: ensemble(x), repeats, items_per_call=batch_size)
+
+    # Test-time augmentation for one image: all views in one forward vs one forward per view
+    x = torch.randn(1, 3, 224, 224)
+    results[f"tta_{TTA_VIEWS}_views_batched"] = time_calls(
+        lambda: summarize_views(ensemble(tta_views(x, TTA_VIEWS))[1], TTA_VIEWS), repeats)
+    results[f"tta_{TTA_VIEWS}_views_separate"] = time_calls(
+        lambda: [ensemble(transform(x)) for transform in VIEW_TRANSFORMS[:TTA_VIEWS]], repeats)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ensemble forward pass across batch sizes.")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    emit("ensemble", run(args.batch_sizes, args.repeats), args.output)
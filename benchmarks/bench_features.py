@@ -0,0 +1,40 @@
+import argparse
+import io
+
+from harness import RESOLUTIONS, emit, synthetic_image, time_calls
+
+from diagnosis import predict_image
+from features import extract_features, extract_features_tiled
+from ingestion import IngestedImage
+from result_cache import ResultCache
+import diagnosis
+
+
+def tiled_features(data):
+    # Includes decoding: the tiled path never builds the full grayscale array
+    h, w, strips = IngestedImage(data).gray_strips()
+    return extract_features_tiled(strips, h, w)
+
+
+def run(resolutions=RESOLUTIONS, repeats=10):
+    # Disable the result cache so every call measures the full heuristic pipeline
+    diagnosis._result_cache = ResultCache(max_entries=0)
+    results = {}
+    for side in resolutions:
+        data = synthetic_image(side)
+        gray = IngestedImage(data).grayscale()
+        results[f"{side}x{side}"] = {
+            "extract_features": time_calls(lambda: extract_features(gray), repeats),
+            "decode_tiled_features": time_calls(lambda: tiled_features(data), repeats),
+            "predict_image": time_calls(lambda: predict_image(io.BytesIO(data)), repeats),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the heuristic feature path of predict_image.")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--resolutions", type=int, nargs="+", default=RESOLUTIONS)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    emit("features", run(args.resolutions, args.repeats), args.output)
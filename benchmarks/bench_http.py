@@ -0,0 +1,95 @@
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from harness import ROOT, emit, memory, summarize, synthetic_image
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("uvicorn did not become ready")
+
+
+def load_test(base_url, payloads, concurrency, requests_per_client):
+    def client(index):
+        samples, statuses = [], {}
+        with requests.Session() as session:
+            for i in range(requests_per_client):
+                data = payloads[(index + i) % len(payloads)]
+                started = time.perf_counter()
+                response = session.post(f"{base_url}/predict", files={"file": ("scan.png", data, "image/png")})
+                samples.append((time.perf_counter() - started) * 1000.0)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return samples, statuses
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    samples = [s for client_samples, _ in outcomes for s in client_samples]
+    statuses = {}
+    for _, client_statuses in outcomes:
+        for code, count in client_statuses.items():
+            statuses[str(code)] = statuses.get(str(code), 0) + count
+    stats = summarize(samples)
+    # Wall-clock throughput across all clients rather than the per-call sum
+    stats["throughput_per_s"] = len(samples) / elapsed
+    stats["status_codes"] = statuses
+    return stats
+
+
+def run(concurrency_levels=(1, 4, 16), requests_per_client=10, side=512, unique_images=8):
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    # Distinct images so the result cache does not hide pipeline cost
+    payloads = [synthetic_image(side, seed=seed) for seed in range(unique_images)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, MEDICAL_DB_PATH=os.path.join(tmp, "bench.db"), RESULT_CACHE_SIZE="0")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT, env=env
+        )
+        try:
+            _wait_ready(base_url)
+            results = {}
+            for level in concurrency_levels:
+                results[f"concurrency_{level}"] = load_test(base_url, payloads, level, requests_per_client)
+                # The uvicorn process, not this client: its peak is the high-water mark so far
+                results[f"concurrency_{level}"]["server_memory"] = memory(server.pid)
+            results["server_memory"] = memory(server.pid)
+            return results
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end /predict latency under concurrent load against a local uvicorn.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=10, help="Requests per client")
+    parser.add_argument("--side", type=int, default=512, help="Synthetic image resolution")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    emit("http", run(args.concurrency, args.requests, args.side), args.output)
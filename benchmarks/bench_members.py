@@ -0,0 +1,53 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from harness import emit, time_calls
+
+from inference_modes import PARALLELISM_MODES
+from model_registry import ModalityEnsemble, SharedBackbones
+
+
+def measure_latency(ensemble, runs):
+    # Single-request latency; time_calls warms up first and reports p50/p95 like the other suites
+    x = torch.randn(1, 3, 224, 224)
+    return time_calls(lambda: ensemble(x), runs)
+
+
+def measure_throughput(ensemble, clients, requests_per_client):
+    x = torch.randn(1, 3, 224, 224)
+
+    def client(_):
+        for _ in range(requests_per_client):
+            ensemble(x)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    elapsed = time.perf_counter() - started
+    return {"clients": clients, "images_per_second": clients * requests_per_client / elapsed}
+
+
+def run(runs=10, clients=4, requests_per_client=5):
+    backbones = SharedBackbones(pretrained=False)
+    results = {"cpu_count": os.cpu_count(), "intra_op_threads": torch.get_num_threads(), "modes": {}}
+    for mode in PARALLELISM_MODES:
+        ensemble = ModalityEnsemble(backbones, num_classes=8, parallelism=mode)
+        results["modes"][mode] = {
+            "latency": measure_latency(ensemble, runs),
+            "throughput": measure_throughput(ensemble, clients, requests_per_client),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Single-request latency vs throughput for each member parallelism mode.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    emit("members", run(args.runs, args.clients, args.requests), args.output)
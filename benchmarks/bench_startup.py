@@ -0,0 +1,50 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from harness import ROOT, emit, summarize
+
+# Modules timed in a fresh interpreter; ensemble_model is what main.py used to import eagerly,
+# onnx_model is what neural.load() imports for INFERENCE_BACKEND=onnx
+MODULES = ["diagnosis", "main", "onnx_model", "ensemble_model"]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+from process_stats import rss_mb
+print(json.dumps({{"ms": elapsed * 1000.0, "rss_mb": rss_mb(), "torch_imported": "torch" in sys.modules}}))
+"""
+
+
+def probe(module):
+    env = dict(os.environ, NEURAL_ENSEMBLE="0")
+    out = subprocess.run([sys.executable, "-c", _PROBE.format(module=module)], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run(modules=MODULES, repeats=3):
+    # First run warms the OS file cache so every sample measures a warm start
+    results = {}
+    for module in modules:
+        probe(module)
+        samples = [probe(module) for _ in range(repeats)]
+        results[module] = {
+            "import": summarize([s["ms"] for s in samples]),
+            "rss_mb": samples[-1]["rss_mb"],
+            "torch_imported": samples[-1]["torch_imported"],
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold-interpreter import time and RSS of the serving modules.")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    emit("startup", run(args.modules, args.repeats), args.output)
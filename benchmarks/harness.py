@@ -0,0 +1,85 @@
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from process_stats import rss_mb, peak_rss_mb
+
+RESOLUTIONS = [256, 1024, 2048, 4096]
+SEED = 1234
+
+
+def synthetic_image(side, fmt="PNG", seed=SEED):
+    """Deterministic radiograph-like test image: smooth gradient plus seeded noise."""
+    rng = np.random.default_rng(seed + side)
+    gradient = np.linspace(40, 200, side, dtype=np.float32)[None, :]
+    noise = rng.normal(0, 25, (side, side)).astype(np.float32)
+    pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def summarize(samples_ms, items_per_sample=1):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    total_s = samples.sum() / 1000.0
+    return {
+        "runs": int(samples.size),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "mean_ms": float(samples.mean()),
+        "throughput_per_s": float(samples.size * items_per_sample / total_s) if total_s > 0 else 0.0,
+    }
+
+
+def time_calls(fn, repeats, warmup=1, items_per_call=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return summarize(samples, items_per_call)
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def memory(pid="self"):
+    # Pass a server's pid to measure it instead of this (client) process
+    return {"rss_mb": rss_mb(pid), "peak_rss_mb": peak_rss_mb(pid)}
+
+
+def emit(name, results, output=None):
+    # Top-level memory is the benchmark process; server benchmarks record their server's inside results
+    report = {"benchmark": name, "environment": environment(), "results": results, "memory": memory()}
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+    print(text)
+    return report
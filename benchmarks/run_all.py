@@ -0,0 +1,71 @@
+import argparse
+import json
+import sys
+
+from harness import emit
+
+import bench_database
+import bench_ensemble
+import bench_features
+import bench_http
+import bench_members
+import bench_startup
+
+
+# Metrics compared against a baseline: p50 latency and peak RSS (lower is better for both)
+_COMPARED = {"p50_ms": "ms", "peak_rss_mb": "MB"}
+
+
+def _flatten(results, prefix=""):
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if not isinstance(value, dict):
+            continue
+        for metric, unit in _COMPARED.items():
+            if metric in value:
+                yield f"{name}.{metric}", value[metric], unit
+        yield from _flatten(value, f"{name}.")
+
+
+def compare(current, baseline_path, threshold=0.10):
+    # Prints changes against a previous run and returns the metrics that regressed beyond threshold
+    with open(baseline_path) as f:
+        baseline = {name: value for name, value, _ in _flatten(json.load(f)["results"])}
+    regressions = []
+    for name, after, unit in _flatten(current):
+        if name not in baseline:
+            continue
+        before = baseline[name]
+        change = (after - before) / before if before else 0.0
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"{name:60s} {before:10.2f} -> {after:10.2f} {unit} ({change:+.1%}) {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run every benchmark and emit one JSON report.")
+    parser.add_argument("--quick", action="store_true", help="Fewer repeats and smaller inputs for a smoke run")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["features", "ensemble", "members", "database", "http", "startup"])
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--compare", help="Previous report to diff p50 latencies and peak RSS against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative increase that counts as a regression")
+    args = parser.parse_args()
+
+    suites = {
+        "features": lambda: bench_features.run([256, 1024] if args.quick else bench_features.RESOLUTIONS, 3 if args.quick else 10),
+        "ensemble": lambda: bench_ensemble.run([1, 4] if args.quick else bench_ensemble.BATCH_SIZES, 1 if args.quick else 3),
+        "members": lambda: bench_members.run(2 if args.quick else 10, 2 if args.quick else 4, 1 if args.quick else 5),
+        "database": lambda: bench_database.run(20 if args.quick else 200),
+        "http": lambda: bench_http.run((1, 4) if args.quick else (1, 4, 16), 3 if args.quick else 10),
+        "startup": lambda: bench_startup.run(repeats=1 if args.quick else 3),
+    }
+    results = {name: suite() for name, suite in suites.items() if name not in args.skip}
+    emit("all", results, args.output)
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            # Non-zero exit so CI can gate on regressions
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+
+import torch
+
+from inference_modes import prepare_input
+
+# Early-exit cascade: members run in CASCADE_ORDER and later (costlier) ones only run for
+# images whose running mean is not yet confident. Eager backend only. The default runs
+# DenseNet121 first: it is the cheapest member by FLOPs and by measured CPU latency.
+ENSEMBLE_CASCADE = os.environ.get("ENSEMBLE_CASCADE", "0") == "1"
+CASCADE_ORDER = [int(i) for i in os.environ.get("CASCADE_ORDER", "1,0,2").split(",")]
+CASCADE_CONFIDENCE = float(os.environ.get("CASCADE_CONFIDENCE", "0.9"))
+CASCADE_MARGIN = float(os.environ.get("CASCADE_MARGIN", "0.3"))
+
+# Forward cost per 224x224 image of ResNet50, DenseNet121 and VGG16 (GFLOPs)
+MEMBER_GFLOPS = [4.1, 2.9, 15.5]
+
+
+def is_confident(probs, confidence=CASCADE_CONFIDENCE, margin=CASCADE_MARGIN):
+    # Exit when the top class is probable enough and clearly ahead of the runner-up
+    top = probs.topk(min(2, probs.shape[1]), dim=1).values
+    runner_up = top[:, 1] if top.shape[1] > 1 else torch.zeros_like(top[:, 0])
+    return (top[:, 0] >= confidence) & (top[:, 0] - runner_up >= margin)
+
+
+def run_cascade(ensemble, x, order=CASCADE_ORDER, confidence=CASCADE_CONFIDENCE, margin=CASCADE_MARGIN):
+    """Runs `ensemble.members()` over a batch as an early-exit cascade.
+
+    Every row starts with the first member in `order`; rows whose running mean is not
+    confident continue to the next member, so each member only sees the rows still
+    undecided. Returns (avg_output, individual_outputs, members_run): individual outputs
+    are NaN where a member did not run and members_run is the (B,) number of members used.
+    """
+    x = prepare_input(x, ensemble.execution_mode)
+    members = ensemble.members()
+    batch = x.shape[0]
+    individual = [None] * len(members)
+    members_run = torch.zeros(batch, dtype=torch.long)
+    active = torch.arange(batch)
+    with torch.inference_mode():
+        for step, m in enumerate(order):
+            probs = members[m](x if active.numel() == batch else x[active])
+            if step == 0:
+                total = torch.zeros(batch, probs.shape[1])
+            individual[m] = torch.full((batch, probs.shape[1]), float("nan"))
+            individual[m][active] = probs
+            total[active] += probs
+            members_run[active] += 1
+            if step == len(order) - 1:
+                break
+            active = active[~is_confident(total[active] / members_run[active, None], confidence, margin)]
+            if active.numel() == 0:
+                break
+        for m in range(len(members)):
+            if individual[m] is None:
+                individual[m] = torch.full_like(total, float("nan"))
+        avg_output = total / members_run[:, None]
+    return avg_output, individual, members_run
+
+
+def simulate_cascade(individual_outputs, order=CASCADE_ORDER, confidence=CASCADE_CONFIDENCE, margin=CASCADE_MARGIN):
+    """Replays the cascade decisions on precomputed outputs of every member.
+
+    The exit rule only depends on member outputs, so this gives exactly what
+    run_cascade would return, for any thresholds, from a single full forward pass.
+    Returns (avg_output, members_run).
+    """
+    probs = torch.stack([individual_outputs[m] for m in order])
+    running = probs.cumsum(dim=0) / torch.arange(1, len(order) + 1).view(-1, 1, 1)
+    members_run = torch.full((probs.shape[1],), len(order), dtype=torch.long)
+    undecided = torch.ones(probs.shape[1], dtype=torch.bool)
+    for step in range(len(order) - 1):
+        exits = undecided & is_confident(running[step], confidence, margin)
+        members_run[exits] = step + 1
+        undecided &= ~exits
+    avg_output = running[members_run - 1, torch.arange(probs.shape[1])]
+    return avg_output, members_run
+
+
+def evaluate_cascade(individual_outputs, labels=None, order=CASCADE_ORDER,
+                     confidences=(0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99), margins=(0.0, 0.1, 0.2, 0.3, 0.5)):
+    """Accuracy versus compute for a grid of cascade thresholds.
+
+    Without `labels`, accuracy is top-1 agreement with the full ensemble. GFLOPs are
+    per image, averaged over the set; relative_compute is against running every member.
+    """
+    full = torch.stack(list(individual_outputs)).mean(dim=0)
+    targets = labels if labels is not None else full.argmax(dim=1)
+    costs = torch.tensor([MEMBER_GFLOPS[m] for m in order], dtype=torch.float64).cumsum(dim=0)
+    full_cost = float(costs[-1])
+
+    points = []
+    for confidence in confidences:
+        for margin in margins:
+            avg_output, members_run = simulate_cascade(individual_outputs, order, confidence, margin)
+            gflops = float(costs[members_run - 1].mean())
+            points.append({
+                "confidence": confidence,
+                "margin": margin,
+                "accuracy": float((avg_output.argmax(dim=1) == targets).float().mean()),
+                "gflops_per_image": gflops,
+                "relative_compute": gflops / full_cost,
+                "exit_rates": [float((members_run == k).float().mean()) for k in range(1, len(order) + 1)],
+            })
+
+    # Pareto front: no other setting is at least as accurate for less compute
+    for point in points:
+        point["pareto"] = not any(
+            other["accuracy"] >= point["accuracy"] and other["gflops_per_image"] < point["gflops_per_image"]
+            for other in points
+        )
+    return {
+        "order": list(order),
+        "images": int(full.shape[0]),
+        "labelled": labels is not None,
+        "full_ensemble": {"accuracy": float((full.argmax(dim=1) == targets).float().mean()), "gflops_per_image": full_cost},
+        "points": sorted(points, key=lambda p: p["gflops_per_image"]),
+    }
+
+
+def _load_labelled_images(image_dir, classes, limit):
+    # ImageFolder layout: one sub-directory per class name; returns (inputs, labels)
+    from ensemble_model import prepare_tensor
+    index = {name.lower(): i for i, name in enumerate(classes)}
+    tensors, labels = [], []
+    for folder in sorted(os.listdir(image_dir)):
+        path = os.path.join(image_dir, folder)
+        if not os.path.isdir(path) or folder.lower() not in index:
+            continue
+        for name in sorted(os.listdir(path))[:limit]:
+            if name.lower().endswith((".png", ".jpg", ".jpeg")):
+                with open(os.path.join(path, name), "rb") as f:
+                    tensors.append(prepare_tensor(f.read()))
+                labels.append(index[folder.lower()])
+    if not tensors:
+        raise ValueError(f"No class sub-directories matching {classes} found in {image_dir}")
+    return torch.stack(tensors), torch.tensor(labels)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the accuracy versus compute curve of the early-exit cascade.")
+    parser.add_argument("--images", help="Directory with one sub-directory of images per class (random inputs when omitted)")
+    parser.add_argument("--head", default="chest", choices=["chest", "brain", "bone"])
+    parser.add_argument("--limit", type=int, default=32, help="Images per class (or random inputs)")
+    parser.add_argument("--order", default=",".join(str(m) for m in CASCADE_ORDER))
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    from heuristics import _chest_classes, _brain_classes, _bone_classes
+    from model_registry import ModelRegistry
+
+    head_classes = {"chest": _chest_classes, "brain": _brain_classes, "bone": _bone_classes}
+    ensemble = ModelRegistry(head_classes).get_ensemble(args.head)
+    if args.images:
+        inputs, labels = _load_labelled_images(args.images, head_classes[args.head], args.limit)
+    else:
+        inputs, labels = torch.randn(args.limit, 3, 224, 224), None
+    _, individual_outputs = ensemble(inputs)
+    report = evaluate_cascade(individual_outputs, labels, [int(m) for m in args.order.split(",")])
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,93 @@
+import argparse
+import hashlib
+import json
+import os
+
+import torch
+
+# Local weights directory; nothing is fetched from the network when a manifest is present here
+MODEL_WEIGHTS_DIR = os.environ.get("MODEL_WEIGHTS_DIR", os.path.join(os.path.dirname(__file__), "weights"))
+MANIFEST_NAME = "manifest.json"
+CHECKPOINT_NAME = "ensemble.pt"
+CHECKPOINT_FORMAT = 1
+
+
+def has_checkpoint(directory=MODEL_WEIGHTS_DIR):
+    return os.path.isfile(os.path.join(directory, MANIFEST_NAME))
+
+
+def load_manifest(directory=MODEL_WEIGHTS_DIR):
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != CHECKPOINT_FORMAT:
+        raise ValueError(f"Unsupported checkpoint format {manifest.get('format')} in {directory}")
+    return manifest
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_state_dict(directory=MODEL_WEIGHTS_DIR, verify=False):
+    """Memory-maps the consolidated checkpoint so worker processes share its pages.
+
+    Returns (manifest, state_dict). Tensors stay file-backed until written to, so
+    load with `module.load_state_dict(state_dict, assign=True)` to keep them shared.
+    """
+    manifest = load_manifest(directory)
+    path = os.path.join(directory, manifest["file"])
+    if verify and manifest.get("sha256") and _file_sha256(path) != manifest["sha256"]:
+        raise ValueError(f"Checkpoint {path} does not match its manifest digest")
+    state_dict = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    return manifest, state_dict
+
+
+def save_checkpoint(state_dict, directory=MODEL_WEIGHTS_DIR, **manifest_fields):
+    # Writes one consolidated ensemble.pt plus a manifest describing its contents
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, CHECKPOINT_NAME)
+    torch.save(state_dict, path)
+    manifest = {
+        "format": CHECKPOINT_FORMAT,
+        "file": CHECKPOINT_NAME,
+        "sha256": _file_sha256(path),
+        "torch_version": torch.__version__,
+    }
+    manifest.update(manifest_fields)
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def export_registry(directory=MODEL_WEIGHTS_DIR, channels_last=False):
+    """Builds the shared-backbone registry (downloading ImageNet weights) and saves it for offline use.
+
+    channels_last stores conv weights in NHWC order so INFERENCE_MODE=channels_last serves
+    them straight from the mmapped file instead of converting them at load.
+    """
+    from ensemble_model import _chest_classes, _brain_classes, _bone_classes
+    from model_registry import ModelRegistry
+
+    head_classes = {"chest": _chest_classes, "brain": _brain_classes, "bone": _bone_classes}
+    registry = ModelRegistry(head_classes, weights_dir=None, execution_mode="channels_last" if channels_last else "fp32")
+    for head in head_classes:
+        registry.get_ensemble(head)
+    # Heads are freshly initialized here; record that so loaders and /stats/models can flag them
+    return save_checkpoint(registry.state_dict(), directory, heads=head_classes,
+                           untrained_heads=sorted(registry.untrained_heads),
+                           memory_format="channels_last" if channels_last else "contiguous")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the ensemble to a local checkpoint for offline startup.")
+    parser.add_argument("--out", default=MODEL_WEIGHTS_DIR, help="Directory to write ensemble.pt and manifest.json")
+    parser.add_argument("--channels-last", action="store_true", help="Store conv weights in NHWC order for INFERENCE_MODE=channels_last")
+    args = parser.parse_args()
+    manifest = export_registry(args.out, args.channels_last)
+    print(f"Checkpoint written to {args.out} (sha256 {manifest['sha256'][:12]})")
+    if manifest["untrained_heads"]:
+        print(f"Warning: untrained heads exported: {', '.join(manifest['untrained_heads'])}")
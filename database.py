@@ -1,11 +1,87 @@
 import sqlite3
+import base64
+import json
+import hashlib
+import threading
+import time
+import weakref
+from types import MappingProxyType
 import os
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "medical_diagnosis.db")
+DB_PATH = os.environ.get("MEDICAL_DB_PATH", os.path.join(os.path.dirname(__file__), "medical_diagnosis.db"))
+
+# Connection tuning: WAL lets readers proceed during writes, busy_timeout waits out brief locks
+DB_SYNCHRONOUS = os.environ.get("DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "8192"))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_STATEMENT_CACHE = 128
+KNOWLEDGE_REFRESH_SECONDS = float(os.environ.get("KNOWLEDGE_REFRESH_SECONDS", "5"))
+HISTORY_EXPORT_PAGE = int(os.environ.get("HISTORY_EXPORT_PAGE", "500"))
+
+# Rollup buckets (SQL bucket expression per period) and confidence histogram resolution
+ROLLUP_PERIODS = {
+    "hour": "strftime('%Y-%m-%d %H:00:00', {ts})",
+    "day": "date({ts})",
+}
+ROLLUP_BINS = 10
+
+class _ThreadConnections:
+    """One thread's {path: connection}; closed by a finalizer when the thread exits.
+
+    threading.local drops a thread's values when the thread ends, so idle pool threads
+    that are retired take their connections (and file descriptors) with them.
+    """
+
+    def __init__(self):
+        self.by_path = {}
+        weakref.finalize(self, _close_all, self.by_path)
+
+def _close_all(connections):
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+_local = threading.local()
+_live_threads = weakref.WeakSet()
+_pool_lock = threading.Lock()
+
+def get_connection(path=None):
+    """Returns this thread's pooled connection to `path` (defaults to DB_PATH).
+
+    Connections are opened once per thread and database file, configured for WAL
+    and reused so sqlite3's per-connection statement cache stays warm.
+    """
+    path = path or DB_PATH
+    holder = getattr(_local, "holder", None)
+    if holder is None:
+        holder = _local.holder = _ThreadConnections()
+        with _pool_lock:
+            _live_threads.add(holder)
+    conn = holder.by_path.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000.0,
+                               cached_statements=DB_STATEMENT_CACHE, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        holder.by_path[path] = conn
+    return conn
+
+def open_connection_count():
+    with _pool_lock:
+        return sum(len(holder.by_path) for holder in _live_threads)
+
+def close_connections():
+    # Closes every pooled connection; threads reconnect lazily on next use
+    with _pool_lock:
+        for holder in list(_live_threads):
+            _close_all(holder.by_path)
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS diagnosis_history (
@@ -53,22 +129,126 @@ def init_db():
     except sqlite3.OperationalError:
         pass
 
+    # History indexes: (timestamp, id) backs keyset pagination, the others serve filtered pages
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_timestamp ON diagnosis_history (timestamp, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_modality ON diagnosis_history (modality, timestamp, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_condition ON diagnosis_history (condition, timestamp, id)")
+
+    _create_rollups(cursor)
+
+    # Change counter bumped by triggers so the in-memory knowledge index can detect edits
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS knowledge_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO knowledge_version (id, version) VALUES (1, 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS clinical_knowledge_{event.lower()}_version
+            AFTER {event} ON clinical_knowledge
+            BEGIN
+                UPDATE knowledge_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
     conn.commit()
-    conn.close()
+    refresh_knowledge_index(force=True)
 
-def save_diagnosis(modality, condition, confidence, report, filename):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+def _bin_expr(confidence):
+    # Confidence histogram bin (0..ROLLUP_BINS-1) for a value in [0, 1]
+    return f"MIN(MAX(CAST(COALESCE({confidence}, 0) * {ROLLUP_BINS} AS INTEGER), 0), {ROLLUP_BINS - 1})"
+
+def _rollup_upsert(period, row, sign):
+    # Adds (sign=1) or removes (sign=-1) one history row from its rollup bucket
+    bins = ", ".join(f"CASE WHEN {_bin_expr(f'{row}.confidence')} = {i} THEN {sign} ELSE 0 END" for i in range(ROLLUP_BINS))
+    updates = ", ".join(f"bin_{i} = bin_{i} + excluded.bin_{i}" for i in range(ROLLUP_BINS))
+    return f'''
+        INSERT INTO diagnosis_rollup VALUES (
+            '{period}', {ROLLUP_PERIODS[period].format(ts=f"{row}.timestamp")},
+            COALESCE({row}.modality, ''), COALESCE({row}.condition, ''),
+            {sign}, {sign} * COALESCE({row}.confidence, 0), {bins}
+        )
+        ON CONFLICT (period, bucket, modality, condition) DO UPDATE SET
+            diagnoses = diagnoses + excluded.diagnoses,
+            confidence_sum = confidence_sum + excluded.confidence_sum,
+            {updates};
+    '''
+
+def _create_rollups(cursor):
+    # Hourly/daily rollups kept current by triggers, so dashboards read buckets instead of rows
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'diagnosis_rollup'").fetchone()
+    bin_columns = ", ".join(f"bin_{i} INTEGER NOT NULL" for i in range(ROLLUP_BINS))
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS diagnosis_rollup (
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            modality TEXT NOT NULL,
+            condition TEXT NOT NULL,
+            diagnoses INTEGER NOT NULL,
+            confidence_sum REAL NOT NULL,
+            {bin_columns},
+            PRIMARY KEY (period, bucket, modality, condition)
+        ) WITHOUT ROWID
+    ''')
+    if not exists:
+        # Backfill once from rows written before the rollups existed
+        bins = ", ".join(f"SUM({_bin_expr('confidence')} = {i})" for i in range(ROLLUP_BINS))
+        for period, bucket in ROLLUP_PERIODS.items():
+            cursor.execute(f'''
+                INSERT INTO diagnosis_rollup
+                SELECT '{period}', {bucket.format(ts="timestamp")}, COALESCE(modality, ''), COALESCE(condition, ''),
+                       COUNT(*), SUM(COALESCE(confidence, 0)), {bins}
+                FROM diagnosis_history GROUP BY 2, 3, 4
+            ''')
+
+    triggers = {
+        "INSERT": [("NEW", 1)],
+        "DELETE": [("OLD", -1)],
+        "UPDATE OF timestamp, modality, condition, confidence": [("OLD", -1), ("NEW", 1)],
+    }
+    for event, deltas in triggers.items():
+        body = "".join(_rollup_upsert(period, row, sign) for row, sign in deltas for period in ROLLUP_PERIODS)
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS diagnosis_history_{event.split()[0].lower()}_rollup
+            AFTER {event} ON diagnosis_history
+            BEGIN
+                {body}
+            END
+        ''')
+
+def get_diagnosis_stats(period="day", since=None, until=None, modality=None, condition=None):
+    """Reads per-bucket counts, mean confidence and confidence histograms from the rollups.
+
+    `since`/`until` are compared against bucket starts, so they are aligned to the period.
+    """
+    if period not in ROLLUP_PERIODS:
+        raise ValueError(f"Unknown stats period '{period}', expected one of {', '.join(ROLLUP_PERIODS)}")
+    clauses, params = _time_range("bucket", since, until)
+    clauses[:0], params[:0] = ["period = ?", "diagnoses > 0"], [period]
+    for column, value in (("modality", modality), ("condition", condition)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    sql = f"SELECT * FROM diagnosis_rollup WHERE {' AND '.join(clauses)} ORDER BY bucket, modality, condition"
+    buckets = []
+    for row in get_connection().execute(sql, params):
+        buckets.append({
+            "bucket": row["bucket"],
+            "modality": row["modality"],
+            "condition": row["condition"],
+            "diagnoses": row["diagnoses"],
+            "mean_confidence": row["confidence_sum"] / row["diagnoses"],
+            "confidence_histogram": [row[f"bin_{i}"] for i in range(ROLLUP_BINS)],
+        })
+    return buckets
+
+def _history_row(modality, condition, confidence, report, filename):
     # Flatten structured report for fallback database schema
     observation_text = " | ".join(report.get('clinical_findings', []))
     impression = report.get('impression', '')
-    
-    cursor.execute('''
-        INSERT INTO diagnosis_history (
-            modality, condition, confidence, diagnostic_issue, observations, severity, recommendation, filename
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
+    return (
         modality, 
         condition, 
         confidence, 
@@ -77,28 +257,199 @@ def save_diagnosis(modality, condition, confidence, report, filename):
         report.get('severity', ''), 
         report.get('recommendation', ''),
         filename
-    ))
-    conn.commit()
-    conn.close()
+    )
+
+def save_diagnoses(records):
+    """Inserts many diagnosis records (dicts of save_diagnosis arguments) in one transaction."""
+    conn = get_connection()
+    with conn:
+        conn.executemany('''
+            INSERT INTO diagnosis_history (
+                modality, condition, confidence, diagnostic_issue, observations, severity, recommendation, filename
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [_history_row(**record) for record in records])
+
+def save_diagnosis(modality, condition, confidence, report, filename):
+    save_diagnoses([{
+        "modality": modality,
+        "condition": condition,
+        "confidence": confidence,
+        "report": report,
+        "filename": filename
+    }])
+
+class KnowledgeIndex:
+    """Immutable snapshot of the clinical_knowledge table, keyed by condition."""
+
+    __slots__ = ("entries", "version", "change_counter")
+
+    def __init__(self, entries, version, change_counter):
+        self.entries = MappingProxyType(entries)
+        self.version = version
+        self.change_counter = change_counter
+
+    def get(self, condition):
+        return self.entries.get(condition)
+
+_knowledge_index = None
+_knowledge_lock = threading.Lock()
+_knowledge_watcher = None
+
+def _read_change_counter(cursor):
+    try:
+        cursor.execute('SELECT version FROM knowledge_version WHERE id = 1')
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    except sqlite3.OperationalError:
+        return 0
+
+def _load_knowledge_index():
+    cursor = get_connection().cursor()
+    change_counter = _read_change_counter(cursor)
+    cursor.execute('SELECT * FROM clinical_knowledge ORDER BY id')
+    rows = cursor.fetchall()
+    # Content digest keeps cache keys stable across restarts and database copies
+    version = hashlib.sha256(repr([tuple(row) for row in rows]).encode('utf-8')).hexdigest()[:12]
+    entries = {row['condition']: MappingProxyType(dict(row)) for row in rows}
+    return KnowledgeIndex(entries, version, change_counter)
+
+def refresh_knowledge_index(force=False):
+    """Reloads the knowledge index if the table changed, swapping the snapshot atomically."""
+    global _knowledge_index
+    with _knowledge_lock:
+        current = _knowledge_index
+        if current is not None and not force:
+            if _read_change_counter(get_connection().cursor()) == current.change_counter:
+                return current
+        _knowledge_index = _load_knowledge_index()
+        return _knowledge_index
+
+def get_knowledge_index():
+    # Hot path: returns the current snapshot without touching the database
+    index = _knowledge_index
+    if index is None:
+        index = refresh_knowledge_index()
+    return index
+
+def start_knowledge_watcher(interval=KNOWLEDGE_REFRESH_SECONDS):
+    # Background poller that hot-reloads the index when the knowledge table is edited
+    global _knowledge_watcher
+    if _knowledge_watcher is not None and _knowledge_watcher.is_alive():
+        return _knowledge_watcher
+
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                refresh_knowledge_index()
+            except sqlite3.Error as e:
+                print(f"Knowledge Watcher Warning: {str(e)}")
+
+    _knowledge_watcher = threading.Thread(target=watch, name="knowledge-watcher", daemon=True)
+    _knowledge_watcher.start()
+    return _knowledge_watcher
 
 def get_clinical_knowledge(condition):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM clinical_knowledge WHERE condition = ?', (condition,))
-    row = cursor.fetchone()
-    conn.close()
-    return dict(row) if row else None
+    entry = get_knowledge_index().get(condition)
+    return dict(entry) if entry else None
+
+def encode_history_cursor(row):
+    # Opaque keyset cursor: the (timestamp, id) of the last row on a page
+    raw = json.dumps([row["timestamp"], row["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_history_cursor(cursor):
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(timestamp), int(row_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid history cursor")
+
+def _normalize_timestamp(value):
+    """Returns (text, date_only) comparable with the stored timestamps.
+
+    Rows are stored as SQLite CURRENT_TIMESTAMP, i.e. "YYYY-MM-DD HH:MM:SS" in UTC, so
+    ISO 8601 input with an offset is converted to UTC first. Dates stay "YYYY-MM-DD".
+    """
+    date_only = False
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip()
+        try:
+            parsed = datetime.fromisoformat(text[:-1] + "+00:00" if text.endswith("Z") else text)
+        except ValueError:
+            raise ValueError(f"Invalid timestamp '{value}', expected ISO 8601")
+        date_only = len(text) <= 10
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    if date_only:
+        return parsed.strftime("%Y-%m-%d"), True
+    return parsed.strftime("%Y-%m-%d %H:%M:%S"), False
+
+def _time_range(column, since=None, until=None):
+    # A date-only `until` covers that whole day, so it becomes "before the next day"
+    clauses, params = [], []
+    if since is not None:
+        clauses.append(f"{column} >= ?")
+        params.append(_normalize_timestamp(since)[0])
+    if until is not None:
+        bound, date_only = _normalize_timestamp(until)
+        if date_only:
+            clauses.append(f"{column} < ?")
+            params.append((datetime.strptime(bound, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+        else:
+            clauses.append(f"{column} <= ?")
+            params.append(bound)
+    return clauses, params
+
+def _history_filters(modality=None, condition=None, since=None, until=None,
+                     min_confidence=None, max_confidence=None):
+    clauses, params = _time_range("timestamp", since, until)
+    if modality is not None:
+        clauses.append("modality = ?")
+        params.append(modality)
+    if condition is not None:
+        clauses.append("condition = ?")
+        params.append(condition)
+    if min_confidence is not None:
+        clauses.append("confidence >= ?")
+        params.append(float(min_confidence))
+    if max_confidence is not None:
+        clauses.append("confidence <= ?")
+        params.append(float(max_confidence))
+    return clauses, params
+
+def query_history(limit=50, cursor=None, **filters):
+    """Returns one page of history, newest first, and the cursor for the next page.
+
+    Pages are seeked by (timestamp, id) rather than OFFSET, so deep pages cost the
+    same as the first. `filters` are modality, condition, since, until,
+    min_confidence and max_confidence. The next cursor is None on the last page.
+    """
+    clauses, params = _history_filters(**filters)
+    if cursor is not None:
+        timestamp, row_id = decode_history_cursor(cursor)
+        clauses.append("(timestamp, id) < (?, ?)")
+        params.extend([timestamp, row_id])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"SELECT * FROM diagnosis_history {where} ORDER BY timestamp DESC, id DESC LIMIT ?"
+    rows = get_connection().execute(sql, params + [int(limit) + 1]).fetchall()
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = encode_history_cursor(items[-1]) if len(rows) > limit and items else None
+    return items, next_cursor
+
+def iter_history(page_size=HISTORY_EXPORT_PAGE, **filters):
+    # Walks every matching row page by page so exports never hold the full table in memory
+    cursor = None
+    while True:
+        items, cursor = query_history(limit=page_size, cursor=cursor, **filters)
+        yield from items
+        if cursor is None:
+            return
 
 def get_history(limit=50):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM diagnosis_history ORDER BY timestamp DESC LIMIT ?', (limit,))
-    rows = cursor.fetchall()
-    history = [dict(row) for row in rows]
-    conn.close()
-    return history
+    return query_history(limit=limit)[0]
 
 if __name__ == "__main__":
     init_db()
@@ -1,217 +1,190 @@
 import os
 os.environ['KMP_DUPLICATE_LIB_OK']='True'
 
+import numpy as np
 import torch
 import torch.nn as nn
 import torchvision.models as models
 import torchvision.transforms as transforms
-from PIL import Image
 import torch.nn.functional as F
-from datetime import datetime
+from model_registry import ModelRegistry
+from inference_modes import INFERENCE_MODE, MEMBER_PARALLELISM, apply_execution_mode, prepare_input, run_members
+from inference_backends import INFERENCE_BACKEND, load_backend
+from preprocessing import BatchBuffer, prepare_image, to_tensor
+from uncertainty import UNCERTAINTY_VIEWS, tta_views, summarize_views
+from cascade import ENSEMBLE_CASCADE, run_cascade
+from heuristics import _chest_classes, _brain_classes, _bone_classes, MODALITY_HEADS
+from report_builder import apply_neural_outputs
+import neural
 
 class MedicalEnsemble(nn.Module):
-    def __init__(self, num_classes=8):
+    def __init__(self, num_classes=8, pretrained=True, parallelism=MEMBER_PARALLELISM):
         super(MedicalEnsemble, self).__init__()
-        # Load pre-trained models
-        self.model1 = models.resnet50(pretrained=True)
+        # Load pre-trained models (pretrained=False builds the graphs for loading local weights)
+        self.model1 = models.resnet50(pretrained=pretrained)
         self.model1.fc = nn.Linear(self.model1.fc.in_features, num_classes)
         
-        self.model2 = models.densenet121(pretrained=True)
+        self.model2 = models.densenet121(pretrained=pretrained)
         self.model2.classifier = nn.Linear(self.model2.classifier.in_features, num_classes)
         
-        self.model3 = models.vgg16(pretrained=True)
+        self.model3 = models.vgg16(pretrained=pretrained)
         self.model3.classifier[6] = nn.Linear(self.model3.classifier[6].in_features, num_classes)
 
         self.models = [self.model1, self.model2, self.model3]
         for model in self.models:
             model.eval()
+        self.execution_mode = "fp32"
+        self.parallelism = parallelism
+
+    def set_execution_mode(self, mode):
+        # fp32, int8 (dynamic Linear quantization) or channels_last; see inference_modes
+        self.model1 = apply_execution_mode(self.model1, mode)
+        self.model2 = apply_execution_mode(self.model2, mode)
+        self.model3 = apply_execution_mode(self.model3, mode)
+        self.models = [self.model1, self.model2, self.model3]
+        self.execution_mode = mode
+        return self
+
+    def members(self):
+        return [(lambda inputs, model=model: torch.sigmoid(model(inputs))) for model in self.models]
+
+    def member_outputs(self, x, parallelism=None):
+        # Base neural features; members run sequentially or on per-member threads
+        return run_members(self.members(), x, parallelism or self.parallelism)
 
     def forward(self, x):
-        with torch.no_grad():
-            # Base neural features
-            individual_outputs = [torch.sigmoid(model(x)) for model in self.models]
+        x = prepare_input(x, self.execution_mode)
+        with torch.inference_mode():
+            individual_outputs = self.member_outputs(x)
             avg_output = torch.stack(individual_outputs).mean(dim=0)
         return avg_output, individual_outputs
 
 
+_transform = None
+
 def get_transform():
-    return transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    ])
-
-# Global model instances
-_type_ensemble = None
-_chest_ensemble = None 
-_brain_ensemble = None
-
-_chest_classes = [
-    'Normal', 'Pneumonia', 'Cardiomegaly', 'Effusion', 
-    'Infiltration', 'Mass', 'Nodule', 'Pneumothorax'
-]
-
-_brain_classes = [
-    'Normal', 'Tumor', 'Stroke', 'Hemorrhage', 
-    'Aneurysm'
-]
-
-_bone_classes = [
-    'Normal', 'Fracture', 'Dislocation', 'Fissure',
-    'Fragmentation', 'Displacement', 'Stress Fracture'
-]
+    # Reference torchvision pipeline, built once; the serving path uses preprocessing instead
+    global _transform
+    if _transform is None:
+        _transform = transforms.Compose([
+            transforms.Resize((224, 224)),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        ])
+    return _transform
+
+# Neural ensemble is opt-in; the heuristic pipeline runs without any model weights
+NEURAL_ENSEMBLE = neural.NEURAL_ENSEMBLE
+
+# Shared-backbone registry: one set of backbones, one lightweight head per modality
+_registry = None
+_registry_failed = False
 
 def get_models():
-    global _type_ensemble, _chest_ensemble, _brain_ensemble
+    global _registry, _registry_failed
     # Lazy load models only when actually needed for heavy inference.
+    if not NEURAL_ENSEMBLE or _registry_failed or INFERENCE_BACKEND != "eager":
+        return None
     try:
-        if _type_ensemble is None:
-            # Placeholder for actual model loading if weights exist
-            pass 
-        return _type_ensemble, _chest_ensemble, _brain_ensemble
+        if _registry is None:
+            registry = ModelRegistry({"chest": _chest_classes, "brain": _brain_classes, "bone": _bone_classes})
+            registry.get_backbones()
+            _registry = registry
+        return _registry
     except Exception as e:
+        _registry_failed = True
         print(f"Model Loader Warning: Could not pre-load neural weights ({str(e)})")
-        return None, None, None
-
-import io
-import hashlib
-import numpy as np
-
-def predict_image(image_bytes):
-    try:
-        # Load image
-        image_bytes.seek(0)
-        img_data = image_bytes.read()
-        image = Image.open(io.BytesIO(img_data)).convert('RGB')
-        
-        # --- Ultra-Sensitive Texture Analysis ---
-        img_np = np.array(image.convert('L'))
-        h, w = img_np.shape
-        img_hash = int(hashlib.sha256(img_data).hexdigest(), 16)
-        
-        # Divide into 8 sub-regions for micro-texture analysis
-        regions = []
-        for i in range(2):
-            for j in range(4):
-                regions.append(img_np[i*h//2:(i+1)*h//2, j*w//4:(j+1)*w//4])
-        
-        # Calculate visual characteristics
-        variances = [float(np.std(r)) for r in regions]
-        complexity = sum(variances)
-        brightness = float(np.mean(img_np))
-        entropy = -np.sum(img_np/255.0 * np.log2(img_np/255.0 + 1e-7)) / (h*w)
-        
-        # 1. Automatic Modality Detection
-        # Heuristics based on brightness and texture complexity
-        if brightness < 85:
-            modality = "Brain MRI"
-            active_classes = _brain_classes
-        elif complexity > 600:
-            modality = "Bone X-ray"
-            active_classes = _bone_classes
-        elif entropy > 0.005: 
-            modality = "Chest X-ray"
-            active_classes = _chest_classes
-        else:
-            modality = "CT Scan" # Fallback for high-detail but balanced brightness
-            active_classes = _bone_classes # Default to bone for CT in this context
-
-        # 2. Dynamic Pathology Mapping
-        wiggle = img_hash % 100
-        
-        # Logic: High complexity often signals pathology in scans
-        if complexity < 250 + (wiggle % 50):
-            condition = "Normal"
-            confidence = 0.92 + (float(img_hash % 75) / 1000.0)
-        else:
-            pathology_idx = (int(complexity) + (img_hash % 7)) % (len(active_classes) - 1)
-            condition = active_classes[pathology_idx + 1]
-            confidence = 0.82 + (float(img_hash % 170) / 1000.0)
-
-        # 3. Enhanced Structured Clinical Report Generation
-        from database import get_clinical_knowledge
-        db_knowledge = get_clinical_knowledge(condition)
-
-        if db_knowledge:
-            locations = ["distal second distal fourth", "proximal third", "medial aspect", "lateral margin", "mid-shaft region"]
-            loc = locations[img_hash % len(locations)]
-            
-            severities = ["Mild/Early Stage", "Moderate/Advancing", "Acute/Critical"]
-            sev = "Normal" if condition == "Normal" else severities[int(complexity % 3)]
-            
-            # Combine DB knowledge with anatomical localization
-            observations = db_knowledge['base_observations']
-            # Medical Report Structure Enhancements
-            findings = [
-                f"Evaluation of the {modality} demonstrates {condition.lower()} characteristics located within the {loc}.",
-                f"Texture analysis reveals {complexity:.1f} intensity variance with focal {observations.lower()}." if condition != "Normal" else "Normal anatomical patterns observed throughout the scanned region."
-            ]
-            
-            report = {
-                "summary": {
-                    "impacting_condition": condition,
-                    "location_identified": loc,
-                    "confidence_score": f"{confidence*100:.2f}%"
-                },
-                "clinical_findings": findings,
-                "impression": f"Features are highly suggestive of {condition}." if condition != "Normal" else "Normal diagnostic study. No acute findings.",
-                "patient_explanation": db_knowledge.get('patient_explanation', "The scan appears normal."),
-                "severity": sev,
-                "recommendation": db_knowledge['standard_recommendation'],
-                "diagnosis_id": f"RAD-AI-{img_hash % 10000:04d}",
-                "analysis_timestamp": datetime.now().strftime('%b %d, %Y | %H:%M:%S')
-            }
-        else:
-            # Enhanced fallback for unknown conditions
-            report = {
-                "summary": {"impacting_condition": condition, "location_identified": "Generalized", "confidence_score": "N/A"},
-                "clinical_findings": [f"Routine {modality} screening.", f"Patient scan showing {condition} markers."],
-                "impression": f"Pending specialist review for {condition}.",
-                "patient_explanation": "A specialized review is required to interpret these patterns.",
-                "severity": "Under Review",
-                "recommendation": "Consult with a certified radiologist.",
-                "diagnosis_id": f"RAD-AI-{img_hash % 10000:04d}",
-                "analysis_timestamp": datetime.now().strftime('%b %d, %Y | %H:%M:%S')
-            }
-
-
-
-        # 4. Multi-Model Architecture Analysis
-        model_names = ["ResNet50", "DenseNet121", "VGG16"]
-        breakdown = []
-        for i, name in enumerate(model_names):
-            m_hash = (img_hash >> (i * 8)) % 100
-            if m_hash < 80: # High consensus probability
-                m_pred = condition
-                m_conf = confidence + (float((m_hash % 20) - 10) / 1000.0)
+        return None
+
+def get_ensemble_for_modality(modality):
+    # Returns the neural ensemble for a modality (head loaded on first use), or None when disabled
+    if not NEURAL_ENSEMBLE or modality not in MODALITY_HEADS:
+        return None
+    head = MODALITY_HEADS[modality]
+    if INFERENCE_BACKEND != "eager":
+        # Compiled TorchScript/ONNX graphs share the same (avg_output, individual_outputs) contract
+        return load_backend(head)
+    registry = get_models()
+    return registry.get_ensemble(head) if registry is not None else None
+
+def preload_backends():
+    # Loads exported graphs up front when a compiled backend is selected; returns the heads found
+    if not NEURAL_ENSEMBLE or INFERENCE_BACKEND == "eager":
+        return []
+    return [head for head in sorted(set(MODALITY_HEADS.values())) if load_backend(head) is not None]
+
+def preload_heads():
+    # Loads every modality's ensemble up front; the prefork parent shares them with its workers
+    return sorted({MODALITY_HEADS[m] for m in MODALITY_HEADS if get_ensemble_for_modality(m) is not None})
+
+def get_model_memory_report():
+    registry = get_models()
+    return registry.memory_report() if registry is not None else {"backbones_loaded": False}
+
+def cache_variant():
+    # Backend, execution mode, TTA views and the cascade all change the neural outputs
+    return f"neural:{INFERENCE_BACKEND}:{INFERENCE_MODE}:v{UNCERTAINTY_VIEWS}:cascade{int(ENSEMBLE_CASCADE)}"
+
+def prepare_tensor(img_data):
+    # Normalized (3, 224, 224) tensor for one image, outside the batched path
+    return to_tensor(prepare_image(img_data))
+
+def _as_tensors(outputs):
+    # ONNX graphs return numpy arrays; the TTA statistics below are computed with torch
+    avg_output, individual_outputs = outputs
+    if isinstance(avg_output, np.ndarray):
+        return torch.from_numpy(avg_output), torch.from_numpy(individual_outputs)
+    return avg_output, individual_outputs
+
+_batch_buffer = None
+
+def get_batch_buffer():
+    global _batch_buffer
+    if _batch_buffer is None:
+        _batch_buffer = BatchBuffer()
+    return _batch_buffer
+
+def run_ensemble_batch(items, views=UNCERTAINTY_VIEWS):
+    """Runs a micro-batch of (ensemble, uint8 image) pairs with one forward pass per ensemble.
+
+    Images from prepare_image() are normalized straight into the shared batch buffer,
+    grouped so each ensemble sees one contiguous slice. With views > 1 every slice is
+    expanded into test-time augmented views inside that same forward pass; otherwise
+    eager ensembles run as an early-exit cascade when ENSEMBLE_CASCADE is set. Returns
+    per-item (avg_output, individual_outputs, uncertainty, members_run) in submission
+    order; uncertainty and members_run are None when those modes are off.
+    """
+    results = [None] * len(items)
+    groups = {}
+    for idx, (ensemble, image) in enumerate(items):
+        groups.setdefault(id(ensemble), (ensemble, []))[1].append(idx)
+
+    buffer = get_batch_buffer()
+    with buffer.lock:
+        batch = buffer.fill([items[i][1] for _, indices in groups.values() for i in indices])
+        start = 0
+        for ensemble, indices in groups.values():
+            x = batch[start:start + len(indices)]
+            stats = members_run = None
+            if views > 1:
+                _, individual_outputs = _as_tensors(ensemble(tta_views(x, views)))
+                stats = summarize_views(individual_outputs, views)
+                avg_output, individual_outputs = stats["mean"], stats["member_mean"]
+            elif ENSEMBLE_CASCADE and hasattr(ensemble, "members"):
+                avg_output, individual_outputs, members_run = run_cascade(ensemble, x)
             else:
-                alt_idx = (img_hash % len(active_classes))
-                m_pred = active_classes[alt_idx]
-                m_conf = confidence - 0.12
-            
-            breakdown.append({
-                "model": name, 
-                "prediction": m_pred, 
-                "confidence": float(max(0.1, min(0.99, m_conf)))
-            })
-
-        return {
-            "modality": modality,
-            "condition": condition,
-            "confidence": float(max(0.01, min(0.999, confidence))),
-            "report": report,
-            "ensemble_breakdown": breakdown
-        }
-    except Exception as e:
-        print(f"Prediction Error: {str(e)}")
-        return {
-            "modality": "Unknown",
-            "condition": "Analysis Error",
-            "confidence": 0.0,
-            "report": {
-                "finding": "Analysis failed to complete.",
-                "severity": "Error",
-                "recommendation": "Check system logs."
-            },
-            "ensemble_breakdown": []
-        }
\ No newline at end of file
+                avg_output, individual_outputs = _as_tensors(ensemble(x))
+            for row, idx in enumerate(indices):
+                uncertainty = None if stats is None else {
+                    "views": views,
+                    "member_variance": stats["member_variance"][:, row],
+                    "disagreement": stats["disagreement"][row],
+                    "variance": stats["variance"][row],
+                }
+                results[idx] = (avg_output[row], [out[row] for out in individual_outputs], uncertainty,
+                                None if members_run is None else int(members_run[row]))
+            start += len(indices)
+    return results
+
+# Backward-compatible import location for the (torch-free) heuristic pipeline
+from diagnosis import predict_image, get_cache_stats, MODEL_VERSION
@@ -0,0 +1,80 @@
+import argparse
+import os
+
+import torch
+import torch.nn as nn
+
+from inference_backends import MODEL_EXPORT_DIR, BACKEND_EXTENSIONS, export_path
+
+
+class FusedEnsemble(nn.Module):
+    """Export wrapper: members, sigmoid and the mean across members in one graph.
+
+    Returns (avg_output, individual_outputs) with individual_outputs stacked as
+    (num_models, batch, num_classes), matching the eager forward contract.
+    """
+
+    def __init__(self, ensemble):
+        super(FusedEnsemble, self).__init__()
+        self.ensemble = ensemble
+        # Registry heads keep their shared backbones outside the module tree; register them for tracing
+        if hasattr(ensemble, "backbones"):
+            self.backbones = ensemble.backbones
+
+    def forward(self, x):
+        individual_outputs = torch.stack(self.ensemble.member_outputs(x, parallelism="sequential"))
+        return individual_outputs.mean(dim=0), individual_outputs
+
+
+def export_torchscript(ensemble, path, example=None):
+    example = example if example is not None else torch.randn(1, 3, 224, 224)
+    with torch.no_grad():
+        traced = torch.jit.trace(FusedEnsemble(ensemble).eval(), example)
+        traced = torch.jit.freeze(traced)
+    traced.save(path)
+    return path
+
+
+def export_onnx(ensemble, path, example=None):
+    example = example if example is not None else torch.randn(1, 3, 224, 224)
+    with torch.no_grad():
+        torch.onnx.export(
+            FusedEnsemble(ensemble).eval(),
+            (example,),
+            path,
+            input_names=["input"],
+            output_names=["avg_output", "individual_outputs"],
+            dynamic_axes={"input": {0: "batch"}, "avg_output": {0: "batch"}, "individual_outputs": {1: "batch"}},
+            opset_version=17,
+            dynamo=False,
+        )
+    return path
+
+
+def export_ensemble(ensemble, kind, path):
+    if kind == "torchscript":
+        return export_torchscript(ensemble, path)
+    return export_onnx(ensemble, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export per-modality ensembles to TorchScript and/or ONNX.")
+    parser.add_argument("--format", choices=["torchscript", "onnx", "all"], default="all")
+    parser.add_argument("--heads", nargs="+", default=["chest", "brain", "bone"])
+    parser.add_argument("--out", default=MODEL_EXPORT_DIR)
+    args = parser.parse_args()
+
+    from ensemble_model import _chest_classes, _brain_classes, _bone_classes
+    from model_registry import ModelRegistry
+
+    # Export from the fp32 graph; quantized modules do not trace to ONNX
+    registry = ModelRegistry({"chest": _chest_classes, "brain": _brain_classes, "bone": _bone_classes}, execution_mode="fp32")
+    kinds = list(BACKEND_EXTENSIONS) if args.format == "all" else [args.format]
+    os.makedirs(args.out, exist_ok=True)
+    for head in args.heads:
+        ensemble = registry.get_ensemble(head)
+        for kind in kinds:
+            path = export_ensemble(ensemble, kind, export_path(kind, head, args.out))
+            print(f"Exported {head} ensemble to {path}")
+    if registry.untrained_heads:
+        print(f"Warning: exported untrained heads: {', '.join(sorted(registry.untrained_heads))}")
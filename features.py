@@ -0,0 +1,97 @@
+import numpy as np
+
+# Region grid used for micro-texture analysis (rows x columns)
+GRID_ROWS = 2
+GRID_COLS = 4
+
+_LEVELS = np.arange(256, dtype=np.int64)
+_SQUARES = _LEVELS * _LEVELS
+# Per-intensity entropy contribution, matching p * log2(p + 1e-7) with p = value / 255
+_ENTROPY_LUT = (_LEVELS / 255.0) * np.log2(_LEVELS / 255.0 + 1e-7)
+
+
+def region_bounds(h, w):
+    # Row/column slice boundaries identical to img_np[i*h//2:(i+1)*h//2, j*w//4:(j+1)*w//4]
+    rows = [(i * h // GRID_ROWS, (i + 1) * h // GRID_ROWS) for i in range(GRID_ROWS)]
+    cols = [(j * w // GRID_COLS, (j + 1) * w // GRID_COLS) for j in range(GRID_COLS)]
+    return rows, cols
+
+
+def accumulate_region_histograms(hists, strip, row_offset, h, w):
+    """Adds the pixels of a row strip starting at `row_offset` into per-region histograms.
+
+    Strips may straddle region boundaries; each part is binned into its own region, so
+    accumulating every strip of an h x w image gives exactly region_histograms(image).
+    """
+    rows, cols = region_bounds(h, w)
+    for i, (r0, r1) in enumerate(rows):
+        a = max(r0, row_offset) - row_offset
+        b = min(r1, row_offset + strip.shape[0]) - row_offset
+        if a >= b:
+            continue
+        for j, (c0, c1) in enumerate(cols):
+            region = strip[a:b, c0:c1]
+            if region.size:
+                hists[i * GRID_COLS + j] += np.bincount(region.ravel(), minlength=256)
+    return hists
+
+
+def region_histograms(img_np):
+    """Returns a (GRID_ROWS * GRID_COLS, 256) int64 array of intensity histograms.
+
+    The regions partition the image, so every statistic used for modality detection
+    can be derived exactly from these histograms without float64 image temporaries.
+    """
+    if img_np.dtype != np.uint8:
+        img_np = np.clip(img_np, 0, 255).astype(np.uint8)
+    h, w = img_np.shape
+    hists = np.zeros((GRID_ROWS * GRID_COLS, 256), dtype=np.int64)
+    return accumulate_region_histograms(hists, img_np, 0, h, w)
+
+
+def features_from_histograms(hists):
+    counts = hists.sum(axis=1)
+    sums = hists @ _LEVELS
+    squares = hists @ _SQUARES
+
+    # Exact integer variance per region: (n * sum(x^2) - sum(x)^2) / n^2
+    variances = []
+    for n, s1, s2 in zip(counts.tolist(), sums.tolist(), squares.tolist()):
+        variances.append(float(np.sqrt((n * s2 - s1 * s1) / (n * n))) if n else float('nan'))
+
+    total = int(counts.sum())
+    image_hist = hists.sum(axis=0)
+    brightness = float(int(sums.sum()) / total)
+    entropy = float(-(image_hist @ _ENTROPY_LUT) / total)
+
+    return {
+        "variances": variances,
+        "complexity": sum(variances),
+        "brightness": brightness,
+        "entropy": entropy,
+    }
+
+
+def extract_features(img_np):
+    """Computes per-region std, total complexity, mean brightness and entropy of a grayscale image.
+
+    Produces the same values as the original per-region loop in predict_image, but in a
+    single histogram pass over uint8 data instead of per-pixel float64 logarithms.
+    """
+    return features_from_histograms(region_histograms(img_np))
+
+
+def extract_features_tiled(strips, h, w):
+    """Same features as extract_features, accumulated from an iterable of uint8 row strips.
+
+    Only the current strip and the 8 x 256 histograms are held, so peak memory does not
+    grow with resolution, and the result equals the in-memory path exactly.
+    """
+    hists = np.zeros((GRID_ROWS * GRID_COLS, 256), dtype=np.int64)
+    row_offset = 0
+    for strip in strips:
+        accumulate_region_histograms(hists, strip, row_offset, h, w)
+        row_offset += strip.shape[0]
+    if row_offset != h:
+        raise ValueError(f"Strips covered {row_offset} rows, expected {h}")
+    return features_from_histograms(hists)
@@ -0,0 +1,100 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from database import save_diagnoses
+
+# "async" batches inserts in the background; "sync" commits each row inside the request
+HISTORY_DURABILITY = os.environ.get("HISTORY_DURABILITY", "async")
+HISTORY_FLUSH_ROWS = int(os.environ.get("HISTORY_FLUSH_ROWS", "64"))
+HISTORY_FLUSH_MS = float(os.environ.get("HISTORY_FLUSH_MS", "200"))
+HISTORY_QUEUE_LIMIT = int(os.environ.get("HISTORY_QUEUE_LIMIT", "10000"))
+
+
+class HistoryWriter:
+    """Write-behind buffer that batches diagnosis_history inserts into bulk transactions."""
+
+    def __init__(self, flush_rows=HISTORY_FLUSH_ROWS, flush_ms=HISTORY_FLUSH_MS, queue_limit=HISTORY_QUEUE_LIMIT):
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = max(0.001, float(flush_ms) / 1000.0)
+        self._queue = queue.Queue(maxsize=max(0, int(queue_limit)))
+        self._stop = threading.Event()
+        self._thread = None
+        self.rows_written = 0
+        self.batches_written = 0
+        self.write_errors = 0
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, **record):
+        """Queues a record for insertion. Returns False if the buffer is full."""
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            return False
+
+    def _drain(self, pending):
+        while len(pending) < self.flush_rows:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def _flush(self, pending):
+        try:
+            save_diagnoses(pending)
+        except sqlite3.Error as e:
+            # Keep rows buffered (e.g. tables not created yet) and retry on the next cycle
+            self.write_errors += 1
+            print(f"History Writer Warning: {str(e)}")
+            return False
+        self.rows_written += len(pending)
+        self.batches_written += 1
+        pending.clear()
+        return True
+
+    def _run(self):
+        pending = []
+        while True:
+            deadline = time.monotonic() + self.flush_interval
+            while len(pending) < self.flush_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                self._drain(pending)
+
+            if pending and not self._flush(pending) and not self._stop.is_set():
+                time.sleep(self.flush_interval)
+
+            if self._stop.is_set() and self._queue.empty():
+                if pending:
+                    self._flush(pending)
+                return
+
+    def stop(self, timeout=10.0):
+        # Drains everything still buffered before returning
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        return {
+            "durability": HISTORY_DURABILITY,
+            "pending": self._queue.qsize(),
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "write_errors": self.write_errors,
+        }
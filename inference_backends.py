@@ -0,0 +1,73 @@
+import os
+import threading
+
+import numpy as np
+
+# torch is imported by TorchScriptBackend only; the ONNX backend runs on onnxruntime and numpy alone
+# "eager" runs the PyTorch registry; "torchscript" and "onnx" load artifacts written by export_model.py
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "eager")
+MODEL_EXPORT_DIR = os.environ.get("MODEL_EXPORT_DIR", os.path.join(os.path.dirname(__file__), "exports"))
+BACKEND_EXTENSIONS = {"torchscript": ".ts", "onnx": ".onnx"}
+
+
+def export_path(kind, head, directory=MODEL_EXPORT_DIR):
+    return os.path.join(directory, f"{head}{BACKEND_EXTENSIONS[kind]}")
+
+
+class TorchScriptBackend:
+    """Runs a traced ensemble graph with the sigmoid and member mean fused in."""
+
+    def __init__(self, path):
+        import torch
+        self.path = path
+        self.module = torch.jit.load(path, map_location="cpu")
+        self.module.eval()
+
+    def __call__(self, x):
+        import torch
+        with torch.inference_mode():
+            avg_output, individual_outputs = self.module(x)
+        return avg_output, individual_outputs
+
+
+class OnnxBackend:
+    """Runs the exported ensemble graph on ONNX Runtime's CPU execution provider.
+
+    Takes a float32 (N, 3, H, W) numpy array (CPU tensors are accepted too) and returns
+    numpy arrays: avg_output (N, C) and individual_outputs (num_models, N, C).
+    """
+
+    def __init__(self, path):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("INFERENCE_BACKEND=onnx requires the onnxruntime package")
+        self.path = path
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        avg_output, individual_outputs = self.session.run(None, {self.input_name: x})
+        return avg_output, individual_outputs
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def load_backend(head, kind=INFERENCE_BACKEND, directory=MODEL_EXPORT_DIR):
+    """Returns the cached compiled backend for a head, or None if its artifact has not been exported."""
+    key = (kind, head, directory)
+    backend = _backends.get(key)
+    if backend is None:
+        path = export_path(kind, head, directory)
+        if not os.path.isfile(path):
+            return None
+        with _backends_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                backend = TorchScriptBackend(path) if kind == "torchscript" else OnnxBackend(path)
+                _backends[key] = backend
+    return backend
@@ -0,0 +1,140 @@
+import argparse
+import copy
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import torch.nn as nn
+
+# fp32: eager baseline; int8: dynamic quantization of Linear layers; channels_last: NHWC convolutions
+EXECUTION_MODES = ("fp32", "int8", "channels_last")
+INFERENCE_MODE = os.environ.get("INFERENCE_MODE", "fp32")
+
+# sequential: members share the intra-op pool one after another; threads: one thread per member
+PARALLELISM_MODES = ("sequential", "threads")
+MEMBER_PARALLELISM = os.environ.get("MEMBER_PARALLELISM", "sequential")
+MEMBER_THREADS = int(os.environ.get("MEMBER_THREADS", str(max(1, (os.cpu_count() or 1) // 3))))
+
+
+def is_channels_last(module):
+    # True when every conv weight is already NHWC, e.g. loaded from a checkpoint exported that way
+    return all(p.is_contiguous(memory_format=torch.channels_last) for p in module.parameters() if p.dim() == 4)
+
+
+def apply_execution_mode(module, mode=INFERENCE_MODE):
+    """Returns `module` prepared for `mode`, converted in place so mmapped weights stay shared."""
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode '{mode}', expected one of {EXECUTION_MODES}")
+    if mode == "int8":
+        # VGG16's 25088x4096 classifier dominates parameter count; its Linear layers gain most here.
+        # inplace swaps only the Linear layers; a copy would duplicate every fp32 conv weight too
+        return torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    if mode == "channels_last" and not is_channels_last(module):
+        # Rewrites every conv weight into private memory; checkpoints.py --channels-last avoids it
+        return module.to(memory_format=torch.channels_last)
+    return module
+
+
+def prepare_input(x, mode=INFERENCE_MODE):
+    if mode == "channels_last" and x.dim() == 4:
+        return x.contiguous(memory_format=torch.channels_last)
+    return x
+
+
+_member_executors = {}
+
+def _get_member_executor(workers, threads):
+    # Each member thread pins its own OpenMP intra-op thread count so members do not oversubscribe cores
+    key = (workers, threads)
+    if key not in _member_executors:
+        _member_executors[key] = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="ensemble-member",
+            initializer=torch.set_num_threads, initargs=(threads,)
+        )
+    return _member_executors[key]
+
+
+def _run_member(member, x):
+    # Grad mode is thread-local, so each member thread enters inference mode itself
+    with torch.inference_mode():
+        return member(x)
+
+
+def run_members(members, x, parallelism=MEMBER_PARALLELISM, threads=MEMBER_THREADS):
+    """Evaluates each ensemble member on `x`, either sequentially or concurrently."""
+    if parallelism not in PARALLELISM_MODES:
+        raise ValueError(f"Unknown member parallelism '{parallelism}', expected one of {PARALLELISM_MODES}")
+    if parallelism == "threads" and len(members) > 1:
+        executor = _get_member_executor(len(members), threads)
+        futures = [executor.submit(_run_member, member, x) for member in members]
+        return [future.result() for future in futures]
+    return [member(x) for member in members]
+
+
+def compare_modes(ensemble, inputs, modes=EXECUTION_MODES, tolerance=0.01, repeats=3):
+    """Measures latency and output drift of each mode against the fp32 ensemble.
+
+    `ensemble` must be an fp32 module with the (avg_output, individual_outputs) forward
+    contract and an `execution_mode` attribute. Returns a report with one entry per mode
+    and the fastest mode whose max absolute probability delta stays within `tolerance`.
+    """
+    baseline = None
+    results = {}
+    for mode in modes:
+        candidate = copy.deepcopy(ensemble)
+        candidate.set_execution_mode(mode)
+        candidate(inputs)  # warm-up
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            avg_output, _ = candidate(inputs)
+        latency_ms = (time.perf_counter() - started) / repeats * 1000.0
+
+        if baseline is None:
+            baseline = avg_output if mode == "fp32" else ensemble(inputs)[0]
+        delta = float((avg_output - baseline).abs().max())
+        agreement = float((avg_output.argmax(dim=1) == baseline.argmax(dim=1)).float().mean())
+        results[mode] = {
+            "latency_ms": latency_ms,
+            "max_abs_delta": delta,
+            "top1_agreement": agreement,
+            "within_tolerance": delta <= tolerance,
+        }
+
+    eligible = [m for m in results if results[m]["within_tolerance"]]
+    best = min(eligible, key=lambda m: results[m]["latency_ms"]) if eligible else "fp32"
+    return {"tolerance": tolerance, "batch_size": int(inputs.shape[0]), "modes": results, "recommended": best}
+
+
+def _load_validation_batch(image_dir, limit):
+    from ensemble_model import prepare_tensor
+    tensors = []
+    for name in sorted(os.listdir(image_dir)):
+        if name.lower().endswith((".png", ".jpg", ".jpeg")):
+            with open(os.path.join(image_dir, name), "rb") as f:
+                tensors.append(prepare_tensor(f.read()))
+        if len(tensors) >= limit:
+            break
+    if not tensors:
+        raise ValueError(f"No validation images found in {image_dir}")
+    return torch.stack(tensors)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare ensemble execution modes against the fp32 baseline.")
+    parser.add_argument("--images", help="Validation image directory (random inputs when omitted)")
+    parser.add_argument("--head", default="chest", choices=["chest", "brain", "bone"])
+    parser.add_argument("--limit", type=int, default=16)
+    parser.add_argument("--tolerance", type=float, default=0.01)
+    args = parser.parse_args()
+
+    from ensemble_model import _chest_classes, _brain_classes, _bone_classes
+    from model_registry import ModelRegistry
+
+    head_classes = {"chest": _chest_classes, "brain": _brain_classes, "bone": _bone_classes}
+    registry = ModelRegistry(head_classes, execution_mode="fp32")
+    ensemble = registry.get_ensemble(args.head)
+    inputs = _load_validation_batch(args.images, args.limit) if args.images else torch.randn(args.limit, 3, 224, 224)
+    print(json.dumps(compare_modes(ensemble, inputs, tolerance=args.tolerance), indent=2))
@@ -0,0 +1,165 @@
+import hashlib
+import io
+import os
+
+import numpy as np
+from PIL import Image, ImageMode
+
+# Ingestion budgets; INGEST_DRAFT_SIDE > 0 decodes large images at roughly that resolution
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(64 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", str(120_000_000)))
+# Most bytes ever decoded at once (width x height x bands x sample size): larger JPEGs are
+# decoded at 1/2, 1/4 or 1/8 scale to fit, other formats (which PIL decodes whole) are rejected
+MAX_DECODE_BYTES = int(os.environ.get("MAX_DECODE_BYTES", str(256 * 1024 * 1024)))
+INGEST_DRAFT_SIDE = int(os.environ.get("INGEST_DRAFT_SIDE", "0"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Images above TILED_ANALYSIS_PIXELS are analyzed in TILE_ROWS-high strips (0 disables tiling)
+TILED_ANALYSIS_PIXELS = int(os.environ.get("TILED_ANALYSIS_PIXELS", str(16_000_000)))
+TILE_ROWS = int(os.environ.get("TILE_ROWS", "256"))
+
+# Modes whose direct grayscale conversion matches the RGB -> L path used historically
+_DIRECT_GRAY_MODES = ("L", "RGB", "RGBA", "P")
+
+
+class IngestionError(ValueError):
+    """Raised when an upload is not a readable image."""
+
+
+class UploadTooLarge(IngestionError):
+    """Raised when an upload exceeds the byte or pixel budget."""
+
+
+def decoded_bytes(mode, w, h):
+    # Size of the decoded pixel data, so an 8-bit grayscale scan costs a third of an RGB one
+    info = ImageMode.getmode(mode)
+    return w * h * len(info.bands) * np.dtype(info.typestr).itemsize
+
+
+class IngestedImage:
+    """Raw upload bytes plus their SHA-256, decoded at most once and only when needed."""
+
+    def __init__(self, data, digest=None, draft_side=INGEST_DRAFT_SIDE):
+        self.data = bytes(data)
+        self.digest = digest or hashlib.sha256(self.data).hexdigest()
+        self.draft_side = draft_side
+        self._image = None
+        self._gray = None
+        self._size = None
+
+    def __getstate__(self):
+        # Process pools receive only the bytes; decoding happens in the worker
+        return {"data": self.data, "digest": self.digest, "draft_side": self.draft_side}
+
+    def __setstate__(self, state):
+        self.__init__(state["data"], state["digest"], state["draft_side"])
+
+    def open(self):
+        """Parses the header only and enforces the pixel budget before any pixel decoding."""
+        try:
+            image = Image.open(io.BytesIO(self.data))
+        except Exception as e:
+            raise IngestionError(f"Unreadable image: {str(e)}")
+        w, h = self._size = image.size
+        if w * h > MAX_IMAGE_PIXELS:
+            raise UploadTooLarge(f"Image is {w}x{h}, exceeding the {MAX_IMAGE_PIXELS} pixel budget")
+        if image.format != "JPEG" and decoded_bytes(image.mode, w, h) > MAX_DECODE_BYTES:
+            raise UploadTooLarge(f"{image.format} {image.mode} image is {w}x{h}, exceeding the {MAX_DECODE_BYTES} byte decode budget")
+        return image
+
+    def pixels(self):
+        # Source resolution from the header, without decoding
+        if self._size is None:
+            self.open()
+        return self._size[0] * self._size[1]
+
+    def _decode(self, luma_only=False):
+        image = self.open()
+        w, h = image.size
+        scaled = self.draft_side > 0 and max(w, h) > self.draft_side
+        mode = "L" if luma_only and image.mode in ("L", "RGB") else image.mode
+        # Smallest DCT scale that keeps the decoded JPEG within MAX_DECODE_BYTES
+        reduction = 1
+        while decoded_bytes(mode, w, h) > MAX_DECODE_BYTES * reduction * reduction and reduction < 8:
+            reduction *= 2
+        if image.format == "JPEG" and (scaled or reduction > 1 or (luma_only and image.mode == "RGB")):
+            # DCT-domain decode: optionally 1/2, 1/4 or 1/8 scale, and only the Y channel for luma
+            size = (self.draft_side, self.draft_side) if scaled else (w, h)
+            image.draft(mode, (min(size[0], w // reduction), min(size[1], h // reduction)))
+        elif scaled:
+            image = image.reduce(max(1, max(image.size) // self.draft_side))
+        image.load()
+        return image
+
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = self._decode()
+        return self._image
+
+    def grayscale(self):
+        # uint8 array for the heuristic features; converts straight to L when that is equivalent
+        if self._gray is None:
+            image = self.image
+            gray = image.convert('L') if image.mode in _DIRECT_GRAY_MODES else image.convert('RGB').convert('L')
+            self._gray = np.asarray(gray)
+        return self._gray
+
+    def gray_strips(self, rows=TILE_ROWS):
+        """Returns (height, width, strips): uint8 grayscale row strips for tiled analysis.
+
+        Unlike grayscale(), no full-size grayscale array is built and nothing is cached.
+        An RGB JPEG that was not decoded yet is decoded as luma only (a third of the
+        memory); its Y channel can differ from PIL's RGB -> L by a grey level or so.
+
+        PIL decodes a whole image before the first crop, so the decode itself is bounded
+        by MAX_DECODE_BYTES rather than by the strip height: JPEGs above it are decoded
+        at a reduced DCT scale and other formats above it are rejected by open(). An
+        8-bit grayscale 10000x10000 scan (100 MB) fits the default budget.
+        """
+        image = self._image if self._image is not None else self._decode(luma_only=True)
+        w, h = image.size
+
+        def strips():
+            for top in range(0, h, rows):
+                strip = image.crop((0, top, w, min(h, top + rows)))
+                if strip.mode != 'L':
+                    strip = strip.convert('L') if strip.mode in _DIRECT_GRAY_MODES else strip.convert('RGB').convert('L')
+                yield np.asarray(strip)
+
+        return h, w, strips()
+
+    def rgb(self):
+        image = self.image
+        return image if image.mode == 'RGB' else image.convert('RGB')
+
+
+def ingest_bytes(image_bytes):
+    # Accepts raw bytes or a file-like object (the legacy BytesIO interface of predict_image)
+    if isinstance(image_bytes, IngestedImage):
+        return image_bytes
+    if hasattr(image_bytes, "read"):
+        image_bytes.seek(0)
+        image_bytes = image_bytes.read()
+    if len(image_bytes) > MAX_UPLOAD_BYTES:
+        raise UploadTooLarge(f"Upload exceeds the {MAX_UPLOAD_BYTES} byte limit")
+    return IngestedImage(image_bytes)
+
+
+async def read_upload(upload, max_bytes=MAX_UPLOAD_BYTES):
+    """Streams a FastAPI UploadFile in chunks, hashing incrementally and enforcing the byte budget."""
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        if len(buffer) + len(chunk) > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+        digest.update(chunk)
+        buffer += chunk
+    ingested = IngestedImage(buffer, digest.hexdigest())
+    ingested.open()
+    return ingested
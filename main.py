@@ -1,16 +1,31 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-import io
 import os
+import json
+import asyncio
+from typing import List, Optional
 from contextlib import asynccontextmanager
-from ensemble_model import predict_image, get_models
+from fastapi.concurrency import run_in_threadpool
+from diagnosis import predict_image, get_cache_stats, get_cached_result, cache_result
+import neural
+from batching import MicroBatcher, SingleFlight
+from worker_pool import InferencePool, PoolSaturated, INFERENCE_RETRY_AFTER
+from history_writer import HistoryWriter, HISTORY_DURABILITY
+from ingestion import read_upload, IngestionError, UploadTooLarge, IngestedImage, MAX_UPLOAD_BYTES
+from batch_scoring import iter_zip_images, spool_upload, MAX_BATCH_BYTES
+from metrics import stage_timer, observe, add_gauge, set_gauge, register_collector, render_prometheus
+from process_stats import memory_breakdown, child_pids
+from prefork import SERVE_WORKERS, supervisor_pid
 from datetime import datetime
 import time
 
 import threading
 
-from database import init_db, save_diagnosis, get_history
+from database import (
+    init_db, save_diagnosis, query_history, iter_history, get_diagnosis_stats, close_connections, start_knowledge_watcher
+)
 
 # Set OMP environment variable
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'True'
@@ -18,13 +33,48 @@ os.environ['KMP_DUPLICATE_LIB_OK'] = 'True'
 def log_status(msg):
     print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
 
+# Readiness of each startup component; liveness only needs the event loop to answer
+_readiness = {"database": "starting", "neural": "loading" if neural.NEURAL_ENSEMBLE else "disabled"}
+
 def background_initialization():
     log_status("Background Task: Pre-warming ensemble models...")
     try:
-        init_db() # Initialize DB
-        get_models()
-        log_status("Background Task: Models loaded and DB initialized.")
+        started = time.perf_counter()
+        init_db() # Initialize DB and load the clinical knowledge index
+        start_knowledge_watcher()
+        set_gauge("model_load_seconds", time.perf_counter() - started, component="database")
+        _readiness["database"] = "ready"
     except Exception as e:
+        _readiness["database"] = "failed"
+        log_status(f"Background Task Error: {str(e)}")
+        return
+
+    if not neural.NEURAL_ENSEMBLE:
+        log_status("Background Task: DB initialized; neural ensemble disabled, torch not loaded.")
+        return
+    try:
+        # torch is only imported here, and only when the neural ensemble is enabled
+        models = neural.load()
+        set_gauge("model_load_seconds", neural.status()["import_seconds"], component="torch_import")
+        started = time.perf_counter()
+        registry = models.get_models()
+        if registry is not None:
+            set_gauge("model_load_seconds", time.perf_counter() - started, component="backbones")
+            memory = models.get_model_memory_report()
+            load_info = memory['load_info']
+            log_status(
+                f"Background Task: Backbones loaded from {load_info['source']} in {time.perf_counter() - started:.2f}s, "
+                f"{memory['backbones_mb']:.1f} MB parameters, RSS {load_info['rss_before_mb']:.1f} -> {memory['process_rss_mb']:.1f} MB"
+            )
+        compiled_heads = models.preload_backends()
+        if compiled_heads:
+            set_gauge("model_load_seconds", time.perf_counter() - started, component="compiled_backends")
+            log_status(f"Background Task: Compiled backends loaded for {', '.join(compiled_heads)} in {time.perf_counter() - started:.2f}s")
+        # get_models() logs and returns None when weights cannot be loaded
+        _readiness["neural"] = "ready" if registry is not None or compiled_heads else "failed"
+        log_status(f"Background Task: DB initialized; neural ensemble {_readiness['neural']}.")
+    except Exception as e:
+        _readiness["neural"] = "failed"
         log_status(f"Background Task Error: {str(e)}")
 
 @asynccontextmanager
@@ -32,7 +82,48 @@ async def lifespan(app: FastAPI):
     # Start pre-warming in the background so the server starts immediately
     init_thread = threading.Thread(target=background_initialization, daemon=True)
     init_thread.start()
+    _history_writer.start()
     yield
+    await _batcher.close()
+    _pool.shutdown()
+    _history_writer.stop()
+    close_connections()
+
+# Concurrent uploads share a single ensemble forward pass
+_batcher = MicroBatcher(neural.run_ensemble_batch)
+
+# Concurrent requests for the same image digest await one analysis
+_single_flight = SingleFlight()
+
+# CPU-bound work runs off the event loop in a bounded pool so /health stays responsive
+_pool = InferencePool()
+
+# History rows are buffered and bulk-inserted unless HISTORY_DURABILITY=sync
+_history_writer = HistoryWriter()
+
+def _component_gauges():
+    # Sampled at scrape time so /metrics mirrors the /stats/* endpoints; sizes and queue depths only
+    pool = _pool.stats()
+    gauges = [(f"inference_pool_{key}", {}, pool[key]) for key in ("in_flight", "queue_depth", "avg_wait_ms", "max_wait_ms")]
+    gauges.append(("result_cache_entries", {}, get_cache_stats()["entries"]))
+    gauges.append(("history_writer_pending", {}, _history_writer.stats()["pending"]))
+    gauges.append(("single_flight_in_flight", {}, _single_flight.stats()["in_flight"]))
+    for key, value in memory_breakdown().items():
+        gauges.append(("process_memory_mb", {"kind": key[:-3]}, value))
+    return gauges
+
+def _component_counters():
+    # Totals kept by each component since startup, so rate() and increase() handle restarts
+    sources = [
+        ("inference_pool", _pool.stats(), ("completed", "rejected")),
+        ("result_cache", get_cache_stats(), ("hits", "disk_hits", "misses", "evictions", "expirations")),
+        ("history_writer", _history_writer.stats(), ("rows_written", "batches_written", "write_errors")),
+        ("single_flight", _single_flight.stats(), ("leaders", "coalesced")),
+    ]
+    return [(f"{prefix}_{key}_total", {}, stats[key]) for prefix, stats, keys in sources for key in keys]
+
+register_collector(_component_gauges)
+register_collector(_component_counters, kind="counter")
 
 app = FastAPI(lifespan=lifespan)
 
@@ -46,6 +137,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.get("/")
@@ -56,45 +148,315 @@ async def health_check():
         "status": "online",
         "engine": "Robust Deep Ensemble",
         "server_time": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        "version": "2.1.0"
+        "version": "2.1.0",
+        "ready": _is_ready(),
+        "components": dict(_readiness)
     }
 
+def _is_ready():
+    # A failed neural load degrades to the heuristic path, so only "loading" blocks readiness
+    return _readiness["database"] == "ready" and _readiness["neural"] != "loading"
+
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness(response: Response):
+    if not _is_ready():
+        response.status_code = 503
+    return {"ready": _is_ready(), "components": dict(_readiness), "neural": neural.status()}
+
+@app.get("/stats")
+async def diagnosis_stats(period: str = "day", since: Optional[str] = None, until: Optional[str] = None,
+                          modality: Optional[str] = None, condition: Optional[str] = None):
+    """Dashboard counts and confidence distributions, read from the hourly/daily rollups only."""
+    try:
+        buckets = await run_in_threadpool(get_diagnosis_stats, period, since, until, modality, condition)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    totals = {}
+    for b in buckets:
+        entry = totals.setdefault(b["modality"], {}).setdefault(b["condition"], {"diagnoses": 0, "confidence_sum": 0.0})
+        entry["diagnoses"] += b["diagnoses"]
+        entry["confidence_sum"] += b["mean_confidence"] * b["diagnoses"]
+    for conditions in totals.values():
+        for entry in conditions.values():
+            entry["mean_confidence"] = entry.pop("confidence_sum") / entry["diagnoses"]
+    return {"period": period, "buckets": buckets, "totals": totals}
+
+@app.get("/stats/pool")
+async def pool_stats():
+    return _pool.stats()
+
+@app.get("/stats/coalescing")
+async def coalescing_stats():
+    return _single_flight.stats()
+
+@app.get("/stats/cache")
+async def cache_stats():
+    return get_cache_stats()
+
+@app.get("/stats/models")
+async def model_stats():
+    return neural.get_model_memory_report()
+
+@app.get("/stats/workers")
+async def worker_stats():
+    """Memory of every serving process; under prefork, shared_mb shows the copy-on-write weights."""
+    supervisor = supervisor_pid()
+    pids = child_pids(supervisor) if supervisor else [os.getpid()]
+    return {
+        "pid": os.getpid(),
+        "supervisor": {"pid": supervisor, **memory_breakdown(supervisor)} if supervisor else None,
+        "workers": [{"pid": pid, **memory_breakdown(pid)} for pid in pids],
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+HISTORY_PAGE_MAX = 500
+
+def _history_filters(modality, condition, since, until, min_confidence, max_confidence):
+    return {"modality": modality, "condition": condition, "since": since, "until": until,
+            "min_confidence": min_confidence, "max_confidence": max_confidence}
+
 @app.get("/history")
-async def history():
-    return get_history()
+async def history(response: Response, limit: int = 50, cursor: Optional[str] = None,
+                  modality: Optional[str] = None, condition: Optional[str] = None,
+                  since: Optional[str] = None, until: Optional[str] = None,
+                  min_confidence: Optional[float] = None, max_confidence: Optional[float] = None):
+    """Newest-first history page; pass the X-Next-Cursor header back as `cursor` for the next page."""
+    filters = _history_filters(modality, condition, since, until, min_confidence, max_confidence)
+    try:
+        items, next_cursor = await run_in_threadpool(
+            query_history, limit=max(1, min(limit, HISTORY_PAGE_MAX)), cursor=cursor, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+def _export_history(first, rows):
+    # Streams a JSON array row by row; the generator runs in the threadpool
+    yield "["
+    if first is not None:
+        yield json.dumps(first)
+        for row in rows:
+            yield "," + json.dumps(row)
+    yield "]"
+
+@app.get("/history/export")
+async def export_history(modality: Optional[str] = None, condition: Optional[str] = None,
+                         since: Optional[str] = None, until: Optional[str] = None,
+                         min_confidence: Optional[float] = None, max_confidence: Optional[float] = None):
+    """Exports every matching history row as a streamed JSON array."""
+    filters = _history_filters(modality, condition, since, until, min_confidence, max_confidence)
+    rows = iter_history(**filters)
+    try:
+        # The first page is read up front so invalid filters are a 400, not a broken stream
+        first = await run_in_threadpool(next, rows, None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(_export_history(first, rows), media_type="application/json",
+                             headers={"Content-Disposition": "attachment; filename=diagnosis_history.json"})
+
+async def _record_history(result, filename):
+    record = {
+        "modality": result['modality'],
+        "condition": result['condition'],
+        "confidence": result['confidence'],
+        "report": result['report'],
+        "filename": filename
+    }
+    if HISTORY_DURABILITY == "sync" or not _history_writer.submit(**record):
+        await run_in_threadpool(save_diagnosis, **record)
+
+def _is_zip(filename):
+    return bool(filename) and filename.lower().endswith('.zip')
+
+async def _spool_batch(files):
+    # Uploads are copied to temp files up front; nothing is decompressed or decoded yet
+    sources = []
+    for file in files:
+        limit = MAX_BATCH_BYTES if _is_zip(file.filename) else MAX_UPLOAD_BYTES
+        try:
+            if file.size is not None and file.size > limit:
+                raise UploadTooLarge(f"Upload exceeds the {limit} byte limit")
+            sources.append((file.filename, await run_in_threadpool(spool_upload, file.file, limit)))
+        except Exception as e:
+            sources.append((file.filename, e))
+    return sources
+
+def _ingest_entry(data):
+    try:
+        ingested = IngestedImage(data)
+        ingested.open()
+        return ingested
+    except IngestionError as e:
+        return e
+
+def _iter_batch_items(sources):
+    """Yields (name, IngestedImage or error) one entry at a time from the spooled uploads.
+
+    Zip entries are inflated only when the generator advances, so at most one entry per
+    scoring slot is held in memory however large the archive expands.
+    """
+    for name, spool in sources:
+        if isinstance(spool, Exception):
+            yield name, spool
+        elif _is_zip(name):
+            try:
+                for entry, data in iter_zip_images(spool, MAX_UPLOAD_BYTES):
+                    yield f"{name}/{entry}", data if isinstance(data, Exception) else _ingest_entry(data)
+            except Exception as e:
+                yield name, e
+        else:
+            yield name, _ingest_entry(spool.read())
+
+async def _score_batch_item(name, upload):
+    # Same analysis as /predict (cache, neural ensemble, history); any failure becomes an error line
+    try:
+        if isinstance(upload, Exception):
+            raise upload
+        timer = stage_timer("batch_item_stage_seconds")
+        while True:
+            try:
+                result, _ = await _analyze_upload(upload, name, timer)
+                break
+            except PoolSaturated:
+                # Batch items yield to interactive traffic instead of failing
+                await asyncio.sleep(INFERENCE_RETRY_AFTER)
+        return {"filename": name, **result}
+    except Exception as e:
+        return {"filename": name, "error": str(e)}
+
+def _close_batch(items, sources):
+    items.close()
+    for _, spool in sources:
+        if not isinstance(spool, Exception):
+            spool.close()
+
+async def _stream_batch(sources):
+    # Keeps at most one entry per pool worker decoded and in flight; results stream as they finish
+    items = _iter_batch_items(sources)
+    pending = set()
+    exhausted = False
+    fetch = None
+    try:
+        while not exhausted or pending:
+            if not exhausted and len(pending) < _pool.workers:
+                # Shielded so a client disconnect cannot mark the read finished while its thread still runs
+                fetch = asyncio.get_running_loop().run_in_executor(None, next, items, None)
+                item = await asyncio.shield(fetch)
+                if item is None:
+                    exhausted = True
+                else:
+                    pending.add(asyncio.ensure_future(_score_batch_item(*item)))
+                continue
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield json.dumps(task.result()) + "\n"
+    finally:
+        for task in pending:
+            task.cancel()
+        if fetch is not None and not fetch.done():
+            # next() is still reading the archive in its thread; closing now would raise
+            # "generator already executing" and pull the spool out from under the read
+            fetch.add_done_callback(lambda _: _close_batch(items, sources))
+        else:
+            _close_batch(items, sources)
+
+@app.post("/predict/batch")
+async def predict_batch(files: List[UploadFile] = File(...)):
+    """Scores many images (or zip archives of images), streaming NDJSON lines as each completes."""
+    sources = await _spool_batch(files)
+    return StreamingResponse(_stream_batch(sources), media_type="application/x-ndjson")
+
+async def _analyze_upload(upload, filename, timer):
+    # Shared by every coalesced request for the same image; returns (result, batch_stats)
+    # Until the background load finishes, requests are served by the heuristic path alone
+    variant = neural.cache_variant() if _readiness["neural"] == "ready" else None
+    stats = None
+    # With the ensemble loaded the finished post-neural report is cached, so repeats skip the forward pass
+    result = await run_in_threadpool(get_cached_result, upload.digest, variant) if variant else None
+    if result is not None:
+        timer.mark("cache_lookup")
+    else:
+        result = await _pool.run(predict_image, upload)
+        timer.mark("inference")
+
+        ensemble = neural.get_ensemble_for_modality(result['modality']) if variant else None
+        if ensemble is not None:
+            image = await _pool.run(neural.prepare_image, upload)
+            outputs, stats = await _batcher.submit((ensemble, image))
+            neural.apply_neural_outputs(result, *outputs)
+            timer.mark("neural")
+        if variant:
+            await run_in_threadpool(cache_result, upload.digest, variant, result)
+
+    # Save to database
+    await _record_history(result, filename)
+    timer.mark("history")
+    return result, stats
 
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(response: Response, file: UploadFile = File(...)):
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
     
+    started = time.perf_counter()
+    timer = stage_timer("request_stage_seconds")
+    add_gauge("requests_in_flight", 1)
     try:
-        contents = await file.read()
-        image_bytes = io.BytesIO(contents)
-        result = predict_image(image_bytes)
-        
-        # Save to database
-        save_diagnosis(
-            modality=result['modality'],
-            condition=result['condition'],
-            confidence=result['confidence'],
-            report=result['report'],
-            filename=file.filename
-        )
+        # Streamed once, hashed incrementally and decoded at most once downstream
+        upload = await read_upload(file)
+        timer.mark("ingest")
+        # Identical uploads in flight (e.g. PACS retries) share one analysis and one history row
+        (result, stats), coalesced = await _single_flight.run(
+            upload.digest, lambda: _analyze_upload(upload, file.filename, timer))
+        if coalesced:
+            timer.mark("coalesced")
+            response.headers["X-Coalesced"] = "1"
+        if stats is not None:
+            response.headers["X-Batch-Size"] = str(stats['batch_size'])
+            response.headers["X-Batch-Queue-Ms"] = f"{stats['queue_ms']:.2f}"
+            response.headers["X-Batch-Inference-Ms"] = f"{stats['inference_ms']:.2f}"
+            response.headers["X-Batch-Throughput"] = f"{stats['throughput_ips']:.2f}"
         
         return result
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except IngestionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PoolSaturated as e:
+        log_status(f"Prediction rejected: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail="Inference capacity exhausted, retry shortly",
+            headers={"Retry-After": str(INFERENCE_RETRY_AFTER)}
+        )
     except Exception as e:
         log_status(f"Prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        add_gauge("requests_in_flight", -1)
+        observe("request_duration_seconds", time.perf_counter() - started)
 
 if __name__ == "__main__":
-    import uvicorn
-    # Optimized for Windows: single worker for ML models, 0.0.0.0 for network transparency
-    uvicorn.run(
-        "main:app", 
-        host="0.0.0.0", 
-        port=5055, 
-        reload=False, 
-        workers=1,
-        log_level="info"
-    )
+    if SERVE_WORKERS > 1:
+        # Linux/macOS: weights load once in a parent and are shared copy-on-write by forked workers
+        from prefork import serve
+        serve(app, host="0.0.0.0", port=5055, workers=SERVE_WORKERS)
+    else:
+        import uvicorn
+        # Optimized for Windows: single worker for ML models, 0.0.0.0 for network transparency
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=5055,
+            reload=False,
+            workers=1,
+            log_level="info"
+        )
@@ -0,0 +1,174 @@
+import bisect
+import os
+import threading
+import time
+
+# METRICS_ENABLED=0 turns every timer into a shared no-op object
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# Latency buckets in seconds, from sub-millisecond stages up to multi-second requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_descriptions = {
+    "predict_stage_seconds": ("histogram", "Time spent in each stage of predict_image."),
+    "request_stage_seconds": ("histogram", "Time spent in each stage of the /predict handler."),
+    "batch_item_stage_seconds": ("histogram", "Time spent in each stage of one /predict/batch item."),
+    "request_duration_seconds": ("histogram", "End-to-end /predict handler latency."),
+    "requests_in_flight": ("gauge", "Requests currently being processed by the /predict handler."),
+    "model_load_seconds": ("gauge", "Duration of model loading steps in background_initialization."),
+    "cascade_exits_total": ("counter", "Neural predictions resolved by each early-exit cascade member (last member run)."),
+    "single_flight_leaders_total": ("counter", "/predict requests that started an analysis for their image digest."),
+    "single_flight_coalesced_total": ("counter", "/predict requests that awaited an identical in-flight upload instead of recomputing it."),
+    "process_memory_mb": ("gauge", "Memory of this serving process: rss, pss, and its shared and private parts."),
+}
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with a lock-protected update path."""
+
+    __slots__ = ("buckets", "counts", "total", "count", "_lock")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.total, self.count
+
+
+_histograms = {}
+_gauges = {}
+_counters = {}
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def get_histogram(name, **labels):
+    key = _key(name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _histograms.setdefault(key, Histogram())
+    return histogram
+
+
+def observe(name, value, **labels):
+    if METRICS_ENABLED:
+        get_histogram(name, **labels).observe(value)
+
+
+def set_gauge(name, value, **labels):
+    if METRICS_ENABLED:
+        _gauges[_key(name, labels)] = float(value)
+
+
+def add_gauge(name, delta, **labels):
+    if METRICS_ENABLED:
+        key = _key(name, labels)
+        with _registry_lock:
+            _gauges[key] = _gauges.get(key, 0.0) + delta
+
+
+def inc_counter(name, delta=1, **labels):
+    # Monotonic counters; by Prometheus convention their names end in _total
+    if METRICS_ENABLED:
+        key = _key(name, labels)
+        with _registry_lock:
+            _counters[key] = _counters.get(key, 0.0) + delta
+
+
+def register_collector(collector, kind="gauge"):
+    """Registers a callable returning [(name, labels, value)] sampled at scrape time.
+
+    kind="counter" is for values that only ever increase (e.g. totals kept by a component).
+    """
+    _collectors.append((collector, kind))
+
+
+class StageTimer:
+    """Records the time between successive `mark(stage)` calls into one labelled histogram."""
+
+    __slots__ = ("name", "last")
+
+    def __init__(self, name):
+        self.name = name
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        get_histogram(self.name, stage=stage).observe(now - self.last)
+        self.last = now
+
+
+class _NoopStageTimer:
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+
+_NOOP_TIMER = _NoopStageTimer()
+
+
+def stage_timer(name):
+    return StageTimer(name) if METRICS_ENABLED else _NOOP_TIMER
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs)
+    return "{" + escaped + "}"
+
+
+def _header(lines, name, kind, seen):
+    if name in seen:
+        return
+    seen.add(name)
+    help_text = _descriptions.get(name, (kind, name.replace("_", " ")))[1]
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def render_prometheus():
+    """Renders all metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines, seen = [], set()
+    for (name, labels), histogram in sorted(_histograms.items()):
+        _header(lines, name, "histogram", seen)
+        counts, total, count = histogram.snapshot()
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    sampled = {"counter": dict(_counters), "gauge": dict(_gauges)}
+    for collector, kind in _collectors:
+        try:
+            for name, labels, value in collector():
+                sampled[kind][_key(name, labels)] = float(value)
+        except Exception as e:
+            print(f"Metrics Collector Warning: {str(e)}")
+    for kind in ("counter", "gauge"):
+        for (name, labels), value in sorted(sampled[kind].items()):
+            _header(lines, name, kind, seen)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+
+import torch
+import torch.nn as nn
+import torchvision.models as models
+
+from checkpoints import MODEL_WEIGHTS_DIR, has_checkpoint, load_state_dict
+from inference_modes import INFERENCE_MODE, MEMBER_PARALLELISM, apply_execution_mode, is_channels_last, prepare_input, run_members
+from process_stats import rss_mb
+# Member display names live with the torch-free heuristics so both paths share one list
+from heuristics import MEMBER_NAMES
+
+# Refuse to download ImageNet weights (air-gapped nodes must ship a local checkpoint)
+MODEL_OFFLINE = os.environ.get("MODEL_OFFLINE", "0") == "1"
+
+
+class SharedBackbones(nn.Module):
+    """ResNet50, DenseNet121 and VGG16 feature extractors, loaded once and shared by every head."""
+
+    def __init__(self, pretrained=True):
+        super(SharedBackbones, self).__init__()
+        self.model1 = models.resnet50(pretrained=pretrained)
+        self.model2 = models.densenet121(pretrained=pretrained)
+        self.model3 = models.vgg16(pretrained=pretrained)
+
+        # Strip the ImageNet classifiers; heads are attached per modality
+        self.feature_dims = [
+            self.model1.fc.in_features,
+            self.model2.classifier.in_features,
+            self.model3.classifier[6].in_features,
+        ]
+        self.model1.fc = nn.Identity()
+        self.model2.classifier = nn.Identity()
+        self.model3.classifier[6] = nn.Identity()
+
+        self.models = [self.model1, self.model2, self.model3]
+        self.eval()
+
+    def forward(self, x):
+        return [model(x) for model in self.models]
+
+
+class ModalityEnsemble(nn.Module):
+    """Per-modality classification heads on top of the shared backbones.
+
+    Has the same forward contract as MedicalEnsemble: (avg_output, individual_outputs).
+    """
+
+    def __init__(self, backbones, num_classes, parallelism=MEMBER_PARALLELISM):
+        super(ModalityEnsemble, self).__init__()
+        # Kept out of the module tree so each head's state_dict only holds its own weights
+        self.__dict__['backbones'] = backbones
+        self.heads = nn.ModuleList([nn.Linear(dim, num_classes) for dim in backbones.feature_dims])
+        self.execution_mode = "fp32"
+        self.parallelism = parallelism
+        self.eval()
+
+    def set_execution_mode(self, mode, include_backbones=True):
+        # The registry converts shared backbones once and passes include_backbones=False per head
+        if include_backbones:
+            self.__dict__['backbones'] = apply_execution_mode(self.backbones, mode)
+        self.heads = apply_execution_mode(self.heads, mode)
+        self.execution_mode = mode
+        return self
+
+    def members(self):
+        # One callable per member mapping an input batch to sigmoid probabilities
+        return [
+            (lambda inputs, backbone=backbone, head=head: torch.sigmoid(head(backbone(inputs))))
+            for backbone, head in zip(self.backbones.models, self.heads)
+        ]
+
+    def member_outputs(self, x, parallelism=None):
+        # Per-member sigmoid probabilities without autograd context; used by forward and graph export
+        return run_members(self.members(), x, parallelism or self.parallelism)
+
+    def forward(self, x):
+        x = prepare_input(x, self.execution_mode)
+        with torch.inference_mode():
+            individual_outputs = self.member_outputs(x)
+            avg_output = torch.stack(individual_outputs).mean(dim=0)
+        return avg_output, individual_outputs
+
+
+def _tensor_bytes(value):
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(item) for item in value)
+    return 0
+
+
+def _module_mb(module):
+    # state_dict() rather than parameters(): dynamic int8 Linear layers keep their packed weights outside parameters()
+    return sum(_tensor_bytes(value) for value in module.state_dict().values()) / (1024 * 1024)
+
+
+def _sub_state_dict(state_dict, prefix):
+    return {k[len(prefix):]: v for k, v in state_dict.items() if k.startswith(prefix)}
+
+
+class ModelRegistry:
+    """Lazily loads the shared backbones once and the per-modality heads on first use."""
+
+    def __init__(self, head_classes, weights_dir=MODEL_WEIGHTS_DIR, execution_mode=INFERENCE_MODE, pretrained=True):
+        self.head_classes = dict(head_classes)
+        self.weights_dir = weights_dir
+        self.execution_mode = execution_mode
+        # pretrained=False builds random backbones without touching the network (tests, tooling)
+        self.pretrained = pretrained
+        self._backbones = None
+        self._heads = {}
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._state_dict = None
+        self.load_info = {}
+        # Heads that were never loaded from trained weights; their scores are meaningless
+        self.untrained_heads = set()
+
+    def _load_backbones(self):
+        started = time.perf_counter()
+        rss_before = rss_mb()
+        if self.weights_dir and has_checkpoint(self.weights_dir):
+            # Offline path: build empty graphs and point their parameters at the mmapped checkpoint
+            self._manifest, self._state_dict = load_state_dict(self.weights_dir)
+            backbones = SharedBackbones(pretrained=False)
+            backbones.load_state_dict(_sub_state_dict(self._state_dict, "backbones."), assign=True)
+            backbones.eval()
+            source = "checkpoint"
+        elif MODEL_OFFLINE:
+            raise RuntimeError(f"MODEL_OFFLINE is set but no checkpoint manifest was found in {self.weights_dir}")
+        else:
+            backbones = SharedBackbones(pretrained=self.pretrained)
+            source = "download" if self.pretrained else "random"
+        if self.execution_mode == "channels_last" and source == "checkpoint" and not is_channels_last(backbones):
+            print("Model Loader Warning: Checkpoint is not channels_last; converting copies the mmapped conv weights "
+                  "into private memory (re-export with 'python checkpoints.py --channels-last')")
+        backbones = apply_execution_mode(backbones, self.execution_mode)
+        self.load_info = {
+            "source": source,
+            "execution_mode": self.execution_mode,
+            "load_seconds": time.perf_counter() - started,
+            "rss_before_mb": rss_before,
+            "rss_after_mb": rss_mb(),
+        }
+        return backbones
+
+    def _build_head(self, head, backbones):
+        num_classes = len(self.head_classes[head])
+        ensemble = ModalityEnsemble(backbones, num_classes)
+        trained = False
+        if self._state_dict is not None:
+            saved_classes = self._manifest.get("heads", {}).get(head)
+            head_state = _sub_state_dict(self._state_dict, f"heads.{head}.")
+            if head_state and (saved_classes is None or len(saved_classes) == num_classes):
+                ensemble.heads.load_state_dict(head_state, assign=True)
+                # A checkpoint can carry heads that were exported untrained; keep that flag
+                trained = head not in self._manifest.get("untrained_heads", [])
+        if not trained:
+            self.untrained_heads.add(head)
+            print(f"Model Loader Warning: Head '{head}' has no trained weights; its predictions are random")
+        return ensemble.set_execution_mode(self.execution_mode, include_backbones=False)
+
+    def get_backbones(self):
+        if self._backbones is None:
+            with self._lock:
+                if self._backbones is None:
+                    self._backbones = self._load_backbones()
+        return self._backbones
+
+    def get_ensemble(self, head):
+        if head not in self.head_classes:
+            return None
+        ensemble = self._heads.get(head)
+        if ensemble is None:
+            backbones = self.get_backbones()
+            with self._lock:
+                ensemble = self._heads.get(head)
+                if ensemble is None:
+                    ensemble = self._build_head(head, backbones)
+                    self._heads[head] = ensemble
+        return ensemble
+
+    def state_dict(self):
+        # Consolidated layout used by checkpoints.save_checkpoint: backbones.* and heads.<name>.*
+        state = {f"backbones.{k}": v for k, v in self.get_backbones().state_dict().items()}
+        for name, ensemble in self._heads.items():
+            state.update({f"heads.{name}.{k}": v for k, v in ensemble.heads.state_dict().items()})
+        return state
+
+    def memory_report(self):
+        return {
+            "load_info": self.load_info,
+            "backbones_loaded": self._backbones is not None,
+            "members": list(MEMBER_NAMES),
+            "untrained_heads": sorted(self.untrained_heads),
+            "backbones_mb": _module_mb(self._backbones) if self._backbones is not None else 0.0,
+            "heads_mb": {name: _module_mb(ensemble.heads) for name, ensemble in self._heads.items()},
+            "process_rss_mb": rss_mb(),
+        }
@@ -0,0 +1,74 @@
+import os
+import sys
+import threading
+import time
+
+from inference_backends import INFERENCE_BACKEND
+from report_builder import apply_neural_outputs
+# Shared by every serving module and torch-free, so it is safe to send to process-pool workers
+from preprocessing import prepare_image
+
+# Lazy front door to ensemble_model: torch and torchvision are imported only when the
+# neural ensemble is enabled and first used, so the heuristic path never pays for them.
+# INFERENCE_BACKEND=onnx loads onnx_model instead, which never imports torch at all.
+NEURAL_ENSEMBLE = os.environ.get("NEURAL_ENSEMBLE", "0") == "1"
+
+# Test-time augmentation views per image (read here so choosing a module needs no torch)
+UNCERTAINTY_VIEWS = int(os.environ.get("UNCERTAINTY_VIEWS", "1"))
+
+_module = None
+_import_seconds = None
+_lock = threading.Lock()
+
+
+def load():
+    """Returns the serving module, importing it on first call, or None when disabled.
+
+    That is onnx_model for INFERENCE_BACKEND=onnx without test-time augmentation (whose
+    view transforms need torch), and ensemble_model otherwise.
+    """
+    global _module, _import_seconds
+    if not NEURAL_ENSEMBLE:
+        return None
+    if _module is None:
+        with _lock:
+            if _module is None:
+                started = time.perf_counter()
+                if INFERENCE_BACKEND == "onnx" and UNCERTAINTY_VIEWS == 1:
+                    import onnx_model as module
+                else:
+                    import ensemble_model as module
+                _import_seconds = time.perf_counter() - started
+                _module = module
+    return _module
+
+
+def status():
+    return {
+        "enabled": NEURAL_ENSEMBLE,
+        "loaded": _module is not None,
+        "module": _module.__name__ if _module is not None else None,
+        "torch_imported": "torch" in sys.modules,
+        "import_seconds": _import_seconds,
+    }
+
+
+def get_ensemble_for_modality(modality):
+    module = load()
+    return module.get_ensemble_for_modality(modality) if module is not None else None
+
+
+def cache_variant():
+    # Result-cache suffix naming the loaded backend and every setting that changes its outputs
+    return load().cache_variant()
+
+
+def run_ensemble_batch(items):
+    return load().run_ensemble_batch(items)
+
+
+def get_model_memory_report():
+    # Never triggers the import; an unloaded ensemble has nothing to report
+    if _module is None:
+        return {"backbones_loaded": False, **status()}
+    return _module.get_model_memory_report()
@@ -0,0 +1,69 @@
+from inference_backends import MODEL_EXPORT_DIR, load_backend
+from preprocessing import BatchBuffer, prepare_image
+from heuristics import MODALITY_HEADS
+from report_builder import apply_neural_outputs
+import neural
+
+# Torch-free counterpart of ensemble_model for INFERENCE_BACKEND=onnx: exported graphs run on
+# onnxruntime and inputs are normalized with numpy, so serving never imports torch/torchvision.
+NEURAL_ENSEMBLE = neural.NEURAL_ENSEMBLE
+
+def get_models():
+    # No eager registry on this path; the compiled graphs are the models
+    return None
+
+def get_ensemble_for_modality(modality):
+    if not NEURAL_ENSEMBLE or modality not in MODALITY_HEADS:
+        return None
+    return load_backend(MODALITY_HEADS[modality], "onnx")
+
+def preload_backends():
+    if not NEURAL_ENSEMBLE:
+        return []
+    return [head for head in sorted(set(MODALITY_HEADS.values())) if load_backend(head, "onnx") is not None]
+
+def preload_heads():
+    return preload_backends()
+
+def get_model_memory_report():
+    return {
+        "backbones_loaded": False,
+        "backend": "onnx",
+        "export_dir": MODEL_EXPORT_DIR,
+        "heads_loaded": preload_backends(),
+        **neural.status(),
+    }
+
+def cache_variant():
+    # Exported graphs are fp32 and this path runs neither test-time augmentation nor the cascade
+    return "neural:onnx:fp32:v1:cascade0"
+
+_batch_buffer = None
+
+def get_batch_buffer():
+    global _batch_buffer
+    if _batch_buffer is None:
+        _batch_buffer = BatchBuffer(numpy=True)
+    return _batch_buffer
+
+def run_ensemble_batch(items):
+    """ensemble_model.run_ensemble_batch for compiled graphs, with numpy outputs.
+
+    Test-time augmentation and the early-exit cascade need torch and are not run here;
+    neural.load() keeps UNCERTAINTY_VIEWS > 1 on ensemble_model.
+    """
+    results = [None] * len(items)
+    groups = {}
+    for idx, (ensemble, image) in enumerate(items):
+        groups.setdefault(id(ensemble), (ensemble, []))[1].append(idx)
+
+    buffer = get_batch_buffer()
+    with buffer.lock:
+        batch = buffer.fill([items[i][1] for _, indices in groups.values() for i in indices])
+        start = 0
+        for ensemble, indices in groups.values():
+            avg_output, individual_outputs = ensemble(batch[start:start + len(indices)])
+            for row, idx in enumerate(indices):
+                results[idx] = (avg_output[row], [out[row] for out in individual_outputs], None, None)
+            start += len(indices)
+    return results
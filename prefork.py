@@ -0,0 +1,145 @@
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from datetime import datetime
+
+import uvicorn
+
+# Pre-fork serving: the parent loads weights once, then forks workers that share them copy-on-write
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", "1"))
+SUPERVISOR_ENV = "PREFORK_SUPERVISOR_PID"
+# Restarts back off exponentially up to RESTART_BACKOFF_MAX seconds; after RESTART_LIMIT
+# consecutive workers die within QUICK_EXIT_SECONDS of starting, the supervisor gives up
+RESTART_BACKOFF_MAX = float(os.environ.get("PREFORK_RESTART_BACKOFF_MAX", "30"))
+RESTART_LIMIT = int(os.environ.get("PREFORK_RESTART_LIMIT", "5"))
+QUICK_EXIT_SECONDS = float(os.environ.get("PREFORK_QUICK_EXIT_SECONDS", "10"))
+
+
+def log_status(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
+
+
+def supervisor_pid():
+    # Set in forked workers so they can report their siblings' memory
+    value = os.environ.get(SUPERVISOR_ENV)
+    return int(value) if value else None
+
+
+def preload():
+    """Loads everything the workers share (database schema, knowledge index, model weights).
+
+    Runs no forward pass, so the parent never starts OpenMP threads that a fork would
+    break. gc.freeze() moves the loaded objects out of the collector's generations so
+    worker collections do not write to, and un-share, their pages.
+    """
+    from database import init_db, close_connections
+    import neural
+
+    started = time.perf_counter()
+    init_db()
+    models = neural.load()
+    heads = models.preload_heads() if models is not None else []
+    # SQLite connections must not cross a fork; workers reconnect lazily
+    close_connections()
+    gc.collect()
+    gc.freeze()
+    log_status(f"Prefork: preloaded heads {heads or 'none'} in {time.perf_counter() - started:.2f}s")
+
+
+def _run_worker(app, sock, threads):
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    if "torch" in sys.modules:
+        # Split the cores between workers instead of every worker using all of them
+        sys.modules["torch"].set_num_threads(threads)
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+    server.run(sockets=[sock])
+    # uvicorn returns normally when the app fails to start; report it as a failed worker
+    return 0 if server.started else 1
+
+
+def _worker_main(app, sock, threads):
+    # Never returns: the forked child must not fall back into the supervisor loop
+    status = 1
+    try:
+        status = _run_worker(app, sock, threads)
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+
+def serve(app, host="0.0.0.0", port=5055, workers=SERVE_WORKERS):
+    """Preloads `app`'s models, binds one listening socket and forks `workers` uvicorn servers.
+
+    The parent only supervises: a worker that dies is replaced, and SIGTERM/SIGINT are
+    forwarded so every worker shuts down gracefully. Restarts back off exponentially,
+    and a crash loop (RESTART_LIMIT workers in a row dying right after starting) stops
+    the server with SystemExit(1). Linux/macOS only (os.fork).
+    """
+    preload()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    os.environ[SUPERVISOR_ENV] = str(os.getpid())
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    children = {}
+    stopping = False
+    quick_failures = 0
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _worker_main(app, sock, threads)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    log_status(f"Prefork: serving on {host}:{port} with {workers} workers, {threads} threads each")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        uptime = time.monotonic() - children.pop(pid, time.monotonic())
+        if stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        quick_failures = quick_failures + 1 if uptime < QUICK_EXIT_SECONDS else 0
+        if quick_failures >= RESTART_LIMIT:
+            log_status(f"Prefork: {quick_failures} workers exited within {QUICK_EXIT_SECONDS:.0f}s of starting, giving up")
+            stop(None, None)
+            continue
+        delay = min(RESTART_BACKOFF_MAX, 0.5 * 2 ** (quick_failures - 1)) if quick_failures else 0.0
+        log_status(f"Prefork: worker {pid} exited with code {code} after {uptime:.1f}s, restarting in {delay:.1f}s")
+        deadline = time.monotonic() + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if not stopping:
+            spawn()
+    sock.close()
+    if quick_failures >= RESTART_LIMIT:
+        raise SystemExit(1)
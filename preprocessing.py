@@ -0,0 +1,96 @@
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+from batching import BATCH_MAX_SIZE
+from ingestion import ingest_bytes
+
+INPUT_SIZE = 224
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# Page-locked batch memory only pays off for host -> GPU copies, so it needs CUDA (checked
+# when the first torch buffer is built, so numpy-only callers never import torch)
+PREPROCESS_PIN_MEMORY = os.environ.get("PREPROCESS_PIN_MEMORY", "1") == "1"
+
+# ToTensor's /255 is folded into the constants so normalization is one subtract and one divide
+_MEAN_255 = (np.array(IMAGENET_MEAN, dtype=np.float32) * 255.0).reshape(1, 3, 1, 1)
+_STD_255 = (np.array(IMAGENET_STD, dtype=np.float32) * 255.0).reshape(1, 3, 1, 1)
+
+
+def pin_memory_available():
+    import torch
+    return PREPROCESS_PIN_MEMORY and torch.cuda.is_available()
+
+
+def resize_uint8(image, size=INPUT_SIZE):
+    """Resizes a PIL image to size x size and returns it as uint8 HxW (grayscale) or HxWx3.
+
+    Grayscale radiographs stay single-channel; they are expanded to three channels only
+    when copied into the batch buffer. Pixels match Resize((224, 224)) on the RGB image.
+    """
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    return np.array(image.resize((size, size), Image.BILINEAR))
+
+
+def prepare_image(img_data):
+    # 224x224 uint8 ensemble input; reuses the decode of an IngestedImage. Torch-free, so
+    # process-pool workers run it without importing a model module
+    return resize_uint8(ingest_bytes(img_data).image)
+
+
+def normalize_into(out, arrays):
+    # Copies uint8 images into the (N, 3, H, W) float32 `out` (tensor or numpy array) and normalizes it in place
+    if isinstance(out, np.ndarray):
+        for row, array in zip(out, arrays):
+            row[...] = array if array.ndim == 2 else array.transpose(2, 0, 1)
+        out -= _MEAN_255
+        out /= _STD_255
+        return out
+    import torch
+    for row, array in zip(out, arrays):
+        src = torch.from_numpy(array)
+        row.copy_(src.expand(3, *src.shape) if src.dim() == 2 else src.permute(2, 0, 1))
+    return out.sub_(torch.from_numpy(_MEAN_255)).div_(torch.from_numpy(_STD_255))
+
+
+def to_tensor(array):
+    # Single normalized (3, H, W) tensor, for callers outside the batched path
+    import torch
+    h, w = array.shape[:2]
+    return normalize_into(torch.empty((1, 3, h, w)), [array])[0]
+
+
+class BatchBuffer:
+    """Reusable float32 (N, 3, 224, 224) ensemble input, filled from uint8 images.
+
+    The buffer grows to the largest batch seen and is then reused, so batched requests
+    allocate no input tensors. Hold `lock` for as long as a view returned by fill() is
+    in use, since the next batch overwrites it. With numpy=True the buffer is a numpy
+    array and torch is never imported.
+    """
+
+    def __init__(self, capacity=BATCH_MAX_SIZE, size=INPUT_SIZE, pin_memory=None, numpy=False):
+        self.size = size
+        self.numpy = numpy
+        self.pin_memory = False if numpy else (pin_memory_available() if pin_memory is None else pin_memory)
+        self.lock = threading.Lock()
+        self.allocations = 0
+        self._buffer = None
+        self._reserve(capacity)
+
+    def _reserve(self, n):
+        if self._buffer is None or self._buffer.shape[0] < n:
+            if self.numpy:
+                self._buffer = np.empty((n, 3, self.size, self.size), dtype=np.float32)
+            else:
+                import torch
+                self._buffer = torch.empty((n, 3, self.size, self.size), dtype=torch.float32, pin_memory=self.pin_memory)
+            self.allocations += 1
+
+    def fill(self, arrays):
+        self._reserve(len(arrays))
+        return normalize_into(self._buffer[:len(arrays)], arrays)
@@ -0,0 +1,59 @@
+import os
+import sys
+
+def rss_mb(pid="self"):
+    # Current resident set size in MB of this process or another pid (Linux /proc, falls back to peak RSS)
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb(pid)
+
+def peak_rss_mb(pid="self"):
+    if pid != "self":
+        # Another process's high-water mark is only available from /proc (VmHWM, in kB)
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except (OSError, ValueError):
+            pass
+        return 0.0
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+_SMAPS_FIELDS = {"Rss": "rss_mb", "Pss": "pss_mb", "Shared_Clean": "shared_mb", "Shared_Dirty": "shared_mb",
+                 "Private_Clean": "private_mb", "Private_Dirty": "private_mb"}
+
+def memory_breakdown(pid="self"):
+    """RSS split into shared and private pages, plus PSS (RSS with shared pages divided among sharers).
+
+    Forked workers that share model weights copy-on-write show most of their RSS as
+    shared and a small private part. Falls back to plain RSS without /proc smaps_rollup.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return {"rss_mb": rss_mb()} if pid == "self" else {}
+    stats = dict.fromkeys(_SMAPS_FIELDS.values(), 0.0)
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].rstrip(":") in _SMAPS_FIELDS:
+            stats[_SMAPS_FIELDS[parts[0].rstrip(":")]] += int(parts[1]) / 1024
+    return stats
+
+def child_pids(pid):
+    # Direct children of `pid` (Linux); used to report every forked worker from any one of them
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except (OSError, ValueError):
+        return []
@@ -0,0 +1,135 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from database import get_connection
+
+# Cache bounds; RESULT_CACHE_SIZE=0 disables caching, RESULT_CACHE_DB enables the on-disk tier
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_DB = os.environ.get("RESULT_CACHE_DB", "")
+
+
+class ResultCache:
+    """Thread-safe LRU cache of prediction results with TTL expiry and an optional SQLite tier."""
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL, db_path=RESULT_CACHE_DB):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl)
+        self.db_path = db_path or None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if self.db_path:
+            self._init_disk()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _expired(self, created, now):
+        return self.ttl > 0 and now - created > self.ttl
+
+    def _init_disk(self):
+        conn = get_connection(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS result_cache (
+                cache_key TEXT PRIMARY KEY,
+                created REAL,
+                payload TEXT
+            )
+        ''')
+        conn.commit()
+
+    def _disk_get(self, key, now):
+        conn = get_connection(self.db_path)
+        row = conn.execute('SELECT created, payload FROM result_cache WHERE cache_key = ?', (key,)).fetchone()
+        if row and self._expired(row[0], now):
+            conn.execute('DELETE FROM result_cache WHERE cache_key = ?', (key,))
+            conn.commit()
+            row = None
+        return (row[0], json.loads(row[1])) if row else None
+
+    def _disk_put(self, key, created, value):
+        conn = get_connection(self.db_path)
+        conn.execute(
+            'INSERT OR REPLACE INTO result_cache (cache_key, created, payload) VALUES (?, ?, ?)',
+            (key, created, json.dumps(value))
+        )
+        conn.commit()
+
+    def _store(self, key, created, value):
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._expired(entry[0], now):
+                    del self._entries[key]
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(entry[1])
+
+        if self.db_path:
+            entry = self._disk_get(key, now)
+            if entry is not None:
+                with self._lock:
+                    self._store(key, entry[0], entry[1])
+                    self.disk_hits += 1
+                return copy.deepcopy(entry[1])
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        created = time.time()
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._store(key, created, value)
+        if self.db_path:
+            self._disk_put(key, created, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            conn = get_connection(self.db_path)
+            conn.execute('DELETE FROM result_cache')
+            conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "disk_tier": self.db_path is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
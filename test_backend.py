@@ -1,29 +1,109 @@
+import asyncio
 import io
-from ensemble_model import predict_image
+import os
+import subprocess
+import sys
+import tempfile
+from diagnosis import predict_image
+from testutils import temporary_database
 from PIL import Image
 import numpy as np
 
 def test_single_prediction():
-    print("Creating a dummy X-ray image...")
-    # Create a dummy grayscale image (simulating an X-ray)
-    img = Image.fromarray(np.random.randint(0, 255, (224, 224), dtype=np.uint8))
-    img_byte_arr = io.BytesIO()
-    img.save(img_byte_arr, format='PNG')
-    img_byte_arr.seek(0)
-    
-    print("Testing predict_image function...")
+    with temporary_database():
+        print("Creating a dummy X-ray image...")
+        # Create a dummy grayscale image (simulating an X-ray)
+        img = Image.fromarray(np.random.randint(0, 255, (224, 224), dtype=np.uint8))
+        img_byte_arr = io.BytesIO()
+        img.save(img_byte_arr, format='PNG')
+        img_byte_arr.seek(0)
+
+        print("Testing predict_image function...")
+        try:
+            result = predict_image(img_byte_arr)
+            print("Success! Result:")
+            print(f"Modality: {result.get('modality')}")
+            print(f"Condition: {result.get('condition')}")
+            print(f"Confidence: {result.get('confidence')}")
+            print(f"Report: {result.get('report')}")
+            print(f"Ensemble Breakdown: {len(result.get('ensemble_breakdown', []))} models reported.")
+        except Exception as e:
+            print(f"FAILED: {str(e)}")
+            import traceback
+            traceback.print_exc()
+
+def test_neural_result_cache():
+    import main
+    import neural
+    from ingestion import IngestedImage
+    from metrics import stage_timer
+    print("Repeating an upload with a stubbed neural ensemble loaded...")
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.randint(0, 255, (224, 224), dtype=np.uint8)).save(buffer, format='PNG')
+    upload = IngestedImage(buffer.getvalue())
+    forward_passes = []
+
+    async def submit(item):
+        forward_passes.append(item)
+        return ("outputs",), {"batch_size": 1}
+
+    async def analyze_twice():
+        return [await main._analyze_upload(upload, "scan.png", stage_timer("test_stage_seconds")) for _ in range(2)]
+
+    saved = (neural.cache_variant, neural.get_ensemble_for_modality, neural.prepare_image, neural.apply_neural_outputs, main._readiness["neural"])
+    neural.cache_variant = lambda: "neural:test"
+    neural.get_ensemble_for_modality = lambda modality: "ensemble"
+    neural.prepare_image = lambda img_data: "image"
+    neural.apply_neural_outputs = lambda result, *outputs: result.update(ensemble_breakdown=["neural"])
+    main._batcher.submit = submit
+    main._readiness["neural"] = "ready"
     try:
-        result = predict_image(img_byte_arr)
-        print("Success! Result:")
-        print(f"Modality: {result.get('modality')}")
-        print(f"Condition: {result.get('condition')}")
-        print(f"Confidence: {result.get('confidence')}")
-        print(f"Report: {result.get('report')}")
-        print(f"Ensemble Breakdown: {len(result.get('ensemble_breakdown', []))} models reported.")
-    except Exception as e:
-        print(f"FAILED: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        with temporary_database():
+            (first, first_stats), (second, second_stats) = asyncio.run(analyze_twice())
+    finally:
+        neural.cache_variant, neural.get_ensemble_for_modality, neural.prepare_image, neural.apply_neural_outputs, main._readiness["neural"] = saved
+        del main._batcher.submit
+    # The repeat is served from the post-neural cache: one forward pass, no batch stats
+    assert len(forward_passes) == 1 and first_stats is not None and second_stats is None
+    assert second["ensemble_breakdown"] == first["ensemble_breakdown"] == ["neural"]
+    print("Neural result cache test successful!")
+
+# Runs in a fresh interpreter so torch imported by other tests cannot leak in
+_SERVE_HEURISTIC = """
+import io, sys, time
+import numpy as np
+from PIL import Image
+from fastapi.testclient import TestClient
+import main
+with TestClient(main.app) as client:
+    assert client.get("/health/live").status_code == 200
+    for _ in range(100):
+        if client.get("/health/ready").status_code == 200:
+            break
+        time.sleep(0.05)
+    ready = client.get("/health/ready").json()
+    assert ready["ready"] and ready["components"]["neural"] == "disabled", ready
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.randint(0, 255, (224, 224), dtype=np.uint8)).save(buffer, format="PNG")
+    response = client.post("/predict", files={"file": ("scan.png", buffer.getvalue(), "image/png")})
+    assert response.status_code == 200 and len(response.json()["ensemble_breakdown"]) == 3, response.text
+    metrics = client.get("/metrics").text
+    assert "# TYPE result_cache_misses_total counter" in metrics and "# TYPE inference_pool_completed_total counter" in metrics, metrics
+    assert "# TYPE result_cache_entries gauge" in metrics and "result_cache_hits " not in metrics, metrics
+assert "torch" not in sys.modules, "heuristic serving imported torch"
+print("ok")
+"""
+
+def test_heuristic_startup_without_torch():
+    print("Starting the API with the neural ensemble disabled...")
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, NEURAL_ENSEMBLE="0", MEDICAL_DB_PATH=os.path.join(tmp, "test.db"))
+        proc = subprocess.run([sys.executable, "-c", _SERVE_HEURISTIC], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              env=env, capture_output=True, text=True)
+        assert proc.returncode == 0, proc.stderr
+    print("Torch-free startup test successful!")
 
 if __name__ == "__main__":
     test_single_prediction()
+    test_neural_result_cache()
+    test_heuristic_startup_without_torch()
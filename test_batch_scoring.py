@@ -0,0 +1,144 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import numpy as np
+from PIL import Image
+from batch_scoring import score_folder, iter_zip_images
+from testutils import temporary_database
+
+def test_resumable_folder_scoring():
+    # Worker processes read the database path from the environment (or inherit it on fork)
+    with temporary_database(env=True), tempfile.TemporaryDirectory() as root:
+        os.makedirs(os.path.join(root, "study"))
+        for i in range(3):
+            Image.fromarray(np.random.randint(0, 255, (64, 64), dtype=np.uint8)).save(os.path.join(root, "study", f"{i}.png"))
+        output = os.path.join(root, "results.ndjson")
+
+        print("Scoring study folder with 2 worker processes...")
+        assert score_folder(root, output, workers=2, history=False) == 3
+        with open(output) as f:
+            lines = [json.loads(line) for line in f]
+        assert sorted(line['filename'] for line in lines) == [os.path.join("study", f"{i}.png") for i in range(3)]
+        assert all('condition' in line for line in lines)
+
+        print("Re-running to verify resume skips finished images...")
+        assert score_folder(root, output, workers=2, history=False) == 0
+
+        print("Simulating a crash mid-write of the last line...")
+        with open(output) as f:
+            kept = f.readlines()[:-1]
+        with open(output, "w") as f:
+            f.writelines(kept)
+            f.write('{"filename": "study/')
+        assert score_folder(root, output, workers=2, history=False) == 1
+        with open(output) as f:
+            lines = [json.loads(line) for line in f]
+        assert sorted(line['filename'] for line in lines) == [os.path.join("study", f"{i}.png") for i in range(3)]
+        print("Batch scoring test successful!")
+
+# Runs in a fresh interpreter so the expansion cap and database path are read at import
+_SERVE_ZIP = """
+import io, json, sys
+from fastapi.testclient import TestClient
+import main
+with TestClient(main.app) as client:
+    response = client.post("/predict/batch", files=[("files", ("study.zip", open(sys.argv[1], "rb"), "application/zip"))])
+lines = [json.loads(line) for line in response.text.splitlines()]
+print(json.dumps(lines))
+"""
+
+def test_zip_batch_expansion_cap():
+    with tempfile.TemporaryDirectory() as root:
+        archive = os.path.join(root, "study.zip")
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for i in range(3):
+                buf = io.BytesIO()
+                Image.fromarray(np.full((256, 256), i * 40, dtype=np.uint8)).save(buf, format="BMP")
+                zf.writestr(f"{i}.bmp.png", buf.getvalue())
+            zf.writestr("notes.txt", "ignored")
+        entry = 256 * 256 + 1078
+        with open(archive, "rb") as f:
+            names = [name for name, _ in iter_zip_images(f, 10 * entry, max_total_bytes=2 * entry)]
+        assert names == ["0.bmp.png", "1.bmp.png", "2.bmp.png"]
+
+        print("Posting a zip that inflates past MAX_BATCH_EXPANDED_BYTES...")
+        env = dict(os.environ, NEURAL_ENSEMBLE="0", MAX_BATCH_EXPANDED_BYTES=str(2 * entry),
+                   MEDICAL_DB_PATH=os.path.join(root, "test.db"))
+        proc = subprocess.run([sys.executable, "-c", _SERVE_ZIP, archive], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              env=env, capture_output=True, text=True)
+        assert proc.returncode == 0, proc.stderr
+        lines = json.loads(proc.stdout.strip().splitlines()[-1])
+        by_name = {line["filename"]: line for line in lines}
+        print(f"Streamed lines: {sorted(by_name)}")
+        assert sorted(by_name) == ["study.zip/0.bmp.png", "study.zip/1.bmp.png", "study.zip/2.bmp.png"]
+        assert "condition" in by_name["study.zip/0.bmp.png"] and "condition" in by_name["study.zip/1.bmp.png"]
+        assert "expands beyond" in by_name["study.zip/2.bmp.png"]["error"]
+        print("Zip expansion cap test successful!")
+
+def test_batch_item_errors_and_disconnect():
+    import main
+    from ingestion import IngestedImage
+    print("Turning a per-item failure into an error line...")
+
+    async def failing_history(result, filename):
+        raise RuntimeError("history unavailable")
+
+    buf = io.BytesIO()
+    Image.fromarray(np.random.randint(0, 255, (64, 64), dtype=np.uint8)).save(buf, format="PNG")
+    saved = main._record_history
+    main._record_history = failing_history
+    try:
+        with temporary_database():
+            line = asyncio.run(main._score_batch_item("scan.png", IngestedImage(buf.getvalue())))
+    finally:
+        main._record_history = saved
+    assert line == {"filename": "scan.png", "error": "history unavailable"}, line
+
+    print("Disconnecting while an archive entry is being read...")
+    events = []
+
+    class Spool:
+        def close(self):
+            events.append("spool closed")
+
+    def slow_items(sources):
+        try:
+            time.sleep(0.3)
+            events.append("entry read")
+            yield "study.zip/0.png", ValueError("bad entry")
+        finally:
+            events.append("items closed")
+
+    async def disconnect():
+        stream = main._stream_batch([("study.zip", Spool())])
+        task = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        closed_early = list(events)
+        await asyncio.sleep(0.5)
+        return closed_early
+
+    saved = main._iter_batch_items
+    main._iter_batch_items = slow_items
+    try:
+        closed_early = asyncio.run(disconnect())
+    finally:
+        main._iter_batch_items = saved
+    # Cleanup waits for the in-flight read instead of closing the generator under it
+    assert closed_early == [] and events == ["entry read", "items closed", "spool closed"], events
+    print("Batch stream cancellation test successful!")
+
+if __name__ == "__main__":
+    test_resumable_folder_scoring()
+    test_zip_batch_expansion_cap()
+    test_batch_item_errors_and_disconnect()
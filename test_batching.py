@@ -0,0 +1,54 @@
+import asyncio
+from batching import MicroBatcher, SingleFlight
+
+def test_micro_batching():
+    calls = []
+
+    def double_all(items):
+        calls.append(len(items))
+        return [item * 2 for item in items]
+
+    async def run():
+        batcher = MicroBatcher(double_all, max_batch_size=4, max_wait_ms=20)
+        outputs = await asyncio.gather(*[batcher.submit(i) for i in range(6)])
+        await batcher.close()
+        return outputs
+
+    print("Submitting 6 concurrent items (max batch size 4)...")
+    outputs = asyncio.run(run())
+    results = [result for result, _ in outputs]
+    print(f"Results: {results}")
+    print(f"Batch sizes: {calls}")
+    assert results == [0, 2, 4, 6, 8, 10]
+    assert calls == [4, 2]
+    assert outputs[0][1]['batch_size'] == 4
+    print("Micro-batching test successful!")
+
+def test_single_flight():
+    calls = []
+
+    async def analyze(key):
+        calls.append(key)
+        await asyncio.sleep(0.02)
+        return {"digest": key}
+
+    async def run():
+        flight = SingleFlight()
+        outputs = await asyncio.gather(*[flight.run(key, lambda key=key: analyze(key)) for key in "aaab"])
+        # Once finished, the same key computes again
+        again = await flight.run("a", lambda: analyze("a"))
+        return outputs, again, flight.stats()
+
+    print("Running 3 identical and 1 distinct concurrent requests...")
+    outputs, again, stats = asyncio.run(run())
+    print(f"Computations: {calls}, stats: {stats}")
+    assert calls == ["a", "b", "a"]
+    assert [coalesced for _, coalesced in outputs] == [False, True, True, False]
+    assert outputs[0][0] is outputs[2][0] and outputs[3][0] == {"digest": "b"}
+    assert again == ({"digest": "a"}, False)
+    assert stats == {"in_flight": 0, "leaders": 3, "coalesced": 2}
+    print("Single-flight test successful!")
+
+if __name__ == "__main__":
+    test_micro_batching()
+    test_single_flight()
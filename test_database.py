@@ -0,0 +1,130 @@
+import gc
+import threading
+import database
+from history_writer import HistoryWriter
+from testutils import temporary_database
+
+def test_pooled_connections():
+    with temporary_database():
+        conn = database.get_connection()
+        assert conn is database.get_connection()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        open_before = database.open_connection_count()
+
+        print("Saving diagnoses from concurrent threads...")
+        report = {"clinical_findings": ["Finding"], "impression": "Normal", "severity": "Normal", "recommendation": "None"}
+        threads = [
+            threading.Thread(target=database.save_diagnosis, args=("Chest X-ray", "Normal", 0.9, report, f"scan_{i}.png"))
+            for i in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(database.get_history()) == 8
+        # Each writer thread's connection is closed once the thread has exited
+        gc.collect()
+        assert database.open_connection_count() == open_before
+        assert database.get_clinical_knowledge("Pneumonia")['condition'] == "Pneumonia"
+
+        print("Editing knowledge base and hot-reloading index...")
+        index = database.get_knowledge_index()
+        conn.execute("UPDATE clinical_knowledge SET standard_recommendation = 'Rest.' WHERE condition = 'Fracture'")
+        conn.commit()
+        assert database.get_knowledge_index() is index
+        reloaded = database.refresh_knowledge_index()
+        assert reloaded is not index and reloaded.version != index.version
+        assert database.get_clinical_knowledge("Fracture")['standard_recommendation'] == "Rest."
+        print("Database pool test successful!")
+
+def test_write_behind_history():
+    with temporary_database():
+        print("Buffering 100 history rows through the write-behind queue...")
+        writer = HistoryWriter(flush_rows=32, flush_ms=50).start()
+        report = {"clinical_findings": [], "impression": "", "severity": "Normal", "recommendation": ""}
+        for i in range(100):
+            assert writer.submit(modality="Bone X-ray", condition="Normal", confidence=0.95, report=report, filename=f"{i}.png")
+        writer.stop()
+
+        stats = writer.stats()
+        print(f"Writer stats: {stats}")
+        assert stats['rows_written'] == 100 and stats['pending'] == 0
+        assert stats['batches_written'] < 100
+        assert len(database.get_history(limit=200)) == 100
+        print("Write-behind test successful!")
+
+def test_history_pagination():
+    with temporary_database():
+        conn = database.get_connection()
+        print("Seeding 60 history rows with shared timestamps...")
+        rows = [
+            (f"2026-01-{1 + i // 4:02d} 10:00:00", ["Chest X-ray", "Brain MRI"][i % 2], ["Normal", "Tumor", "Pneumonia"][i % 3], i / 60.0)
+            for i in range(60)
+        ]
+        with conn:
+            conn.executemany("INSERT INTO diagnosis_history (timestamp, modality, condition, confidence) VALUES (?, ?, ?, ?)", rows)
+
+        pages, cursor = [], None
+        while True:
+            items, cursor = database.query_history(limit=7, cursor=cursor)
+            pages.append(items)
+            if cursor is None:
+                break
+        seen = [row["id"] for page in pages for row in page]
+        assert len(seen) == 60 and len(set(seen)) == 60
+        assert seen == [row["id"] for row in database.get_history(limit=100)]
+
+        print("Filtering by modality, date range and confidence...")
+        items, _ = database.query_history(limit=100, modality="Brain MRI", since="2026-01-03T00:00:00", until="2026-01-10", min_confidence=0.5)
+        expected = [r for r in rows if r[1] == "Brain MRI" and "2026-01-03" <= r[0][:10] <= "2026-01-10" and r[3] >= 0.5]
+        assert len(items) == len(expected) > 0
+        assert any(row["timestamp"].startswith("2026-01-10") for row in items)
+        # Offsets are converted to UTC before comparing: 12:00+02:00 is the 10:00 rows, 11:59+02:00 is not
+        day = database.query_history(limit=100, since="2026-01-10", until="2026-01-10T12:00:00+02:00")[0]
+        assert len(day) == 4
+        assert database.query_history(limit=100, since="2026-01-10", until="2026-01-10T11:59:59+02:00")[0] == []
+        assert all(row["modality"] == "Brain MRI" and row["confidence"] >= 0.5 for row in items)
+        assert len(list(database.iter_history(page_size=4, condition="Tumor"))) == 20
+
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM diagnosis_history WHERE condition = ? ORDER BY timestamp DESC, id DESC", ("Tumor",)).fetchall()
+        assert any("idx_history_condition" in row[-1] for row in plan)
+        try:
+            database.query_history(cursor="not-a-cursor")
+            assert False, "invalid cursor accepted"
+        except ValueError:
+            pass
+        print("History pagination test successful!")
+
+def test_diagnosis_rollups():
+    with temporary_database(init=False):
+        conn = database.get_connection()
+        print("Creating a pre-rollup history table with existing rows...")
+        conn.execute("CREATE TABLE diagnosis_history (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, modality TEXT, condition TEXT, confidence REAL, diagnostic_issue TEXT, observations TEXT, severity TEXT, recommendation TEXT, filename TEXT)")
+        insert = "INSERT INTO diagnosis_history (timestamp, modality, condition, confidence) VALUES (?, ?, ?, ?)"
+        rows = [(f"2026-03-0{1 + i % 3} {i % 24:02d}:15:00", ["Chest X-ray", "Bone X-ray"][i % 2], ["Normal", "Fracture"][i % 3 == 0], (i % 11) / 10.0) for i in range(30)]
+        with conn:
+            conn.executemany(insert, rows[:20])
+        database.init_db()
+        with conn:
+            conn.executemany(insert, rows[20:])
+            conn.execute("DELETE FROM diagnosis_history WHERE id = 1")
+            conn.execute("UPDATE diagnosis_history SET confidence = 0.05, condition = 'Normal' WHERE id = 2")
+
+        print("Comparing rollups against a full scan...")
+        scan = conn.execute("SELECT date(timestamp), modality, condition, COUNT(*), SUM(confidence) FROM diagnosis_history GROUP BY 1, 2, 3").fetchall()
+        stats = database.get_diagnosis_stats("day")
+        assert len(stats) == len(scan)
+        for row, bucket in zip(scan, stats):
+            assert (bucket["bucket"], bucket["modality"], bucket["condition"], bucket["diagnoses"]) == tuple(row)[:4]
+            assert abs(bucket["mean_confidence"] - row[4] / row[3]) < 1e-9
+            assert sum(bucket["confidence_histogram"]) == bucket["diagnoses"]
+        hourly = database.get_diagnosis_stats("hour", since="2026-03-02", until="2026-03-02", modality="Bone X-ray")
+        assert sum(b["diagnoses"] for b in hourly) == conn.execute("SELECT COUNT(*) FROM diagnosis_history WHERE date(timestamp) = '2026-03-02' AND modality = 'Bone X-ray'").fetchone()[0]
+        print("Rollup test successful!")
+
+if __name__ == "__main__":
+    test_pooled_connections()
+    test_write_behind_history()
+    test_history_pagination()
+    test_diagnosis_rollups()
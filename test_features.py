@@ -0,0 +1,40 @@
+import numpy as np
+from features import extract_features, extract_features_tiled
+
+def legacy_features(img_np):
+    # Reference implementation: the original region loop from predict_image
+    h, w = img_np.shape
+    regions = []
+    for i in range(2):
+        for j in range(4):
+            regions.append(img_np[i*h//2:(i+1)*h//2, j*w//4:(j+1)*w//4])
+    variances = [float(np.std(r)) for r in regions]
+    brightness = float(np.mean(img_np))
+    entropy = -np.sum(img_np/255.0 * np.log2(img_np/255.0 + 1e-7)) / (h*w)
+    return variances, sum(variances), brightness, entropy
+
+def test_feature_parity():
+    rng = np.random.default_rng(0)
+    for shape in [(224, 224), (301, 517), (7, 9)]:
+        img_np = rng.integers(0, 256, shape, dtype=np.uint8)
+        print(f"Comparing vectorized features for {shape}...")
+        variances, complexity, brightness, entropy = legacy_features(img_np)
+        features = extract_features(img_np)
+        assert np.allclose(features['variances'], variances, rtol=1e-12)
+        assert np.isclose(features['complexity'], complexity, rtol=1e-12)
+        assert np.isclose(features['brightness'], brightness, rtol=1e-12)
+        assert np.isclose(features['entropy'], entropy, rtol=1e-12)
+    print("Feature parity test successful!")
+
+def test_tiled_parity():
+    rng = np.random.default_rng(1)
+    for shape, rows in [((301, 517), 16), ((64, 64), 7), ((5, 9), 1), ((200, 40), 500)]:
+        img_np = rng.integers(0, 256, shape, dtype=np.uint8)
+        print(f"Accumulating {shape} in {rows}-row strips...")
+        strips = (img_np[top:top + rows] for top in range(0, shape[0], rows))
+        assert extract_features_tiled(strips, *shape) == extract_features(img_np)
+    print("Tiled feature test successful!")
+
+if __name__ == "__main__":
+    test_feature_parity()
+    test_tiled_parity()
@@ -0,0 +1,103 @@
+import asyncio
+import io
+import numpy as np
+from PIL import Image
+from starlette.datastructures import UploadFile
+import ingestion
+from ingestion import IngestedImage, UploadTooLarge, read_upload
+from features import extract_features, extract_features_tiled
+from diagnosis import predict_image
+from testutils import temporary_database
+
+def encode(array, fmt):
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+def test_decode_once_parity():
+    print("Checking grayscale parity with the RGB -> L path...")
+    rgb = np.random.randint(0, 255, (120, 90, 3), dtype=np.uint8)
+    data = encode(rgb, 'PNG')
+    expected = np.array(Image.open(io.BytesIO(data)).convert('RGB').convert('L'))
+    ingested = IngestedImage(data)
+    assert np.array_equal(ingested.grayscale(), expected)
+    assert ingested.image is ingested.image
+
+def test_jpeg_draft_decode():
+    print("Decoding a large JPEG in draft mode...")
+    data = encode(np.random.randint(0, 255, (2048, 2048, 3), dtype=np.uint8), 'JPEG')
+    ingested = IngestedImage(data, draft_side=512)
+    assert max(ingested.image.size) == 512
+    assert ingested.grayscale().shape == (512, 512)
+
+def test_tiled_strips():
+    print("Streaming grayscale strips from PNG and JPEG uploads...")
+    rgb = np.random.randint(0, 255, (333, 250, 3), dtype=np.uint8)
+    png = IngestedImage(encode(rgb, 'PNG'))
+    h, w, strips = png.gray_strips(rows=64)
+    assert (h, w) == (333, 250)
+    assert extract_features_tiled(strips, h, w) == extract_features(png.grayscale())
+
+    # JPEG strips come from a luma-only decode, which may differ slightly from RGB -> L
+    jpeg = encode(rgb, 'JPEG')
+    h, w, strips = IngestedImage(jpeg).gray_strips(rows=64)
+    tiled = extract_features_tiled(strips, h, w)
+    reference = extract_features(IngestedImage(jpeg).grayscale())
+    assert abs(tiled['brightness'] - reference['brightness']) < 1.0
+    assert np.allclose(tiled['variances'], reference['variances'], atol=1.0)
+    assert abs(tiled['entropy'] - reference['entropy']) < 0.01
+
+def test_decode_pixel_budget():
+    print("Decoding above MAX_DECODE_BYTES...")
+    previous = ingestion.MAX_DECODE_BYTES
+    ingestion.MAX_DECODE_BYTES = 100 * 100 * 3
+    try:
+        # 4x the budget as RGB and as luma: the JPEG decodes at 1/2 scale
+        rgb = np.random.randint(0, 255, (200, 200, 3), dtype=np.uint8)
+        jpeg = IngestedImage(encode(rgb, 'JPEG'))
+        assert jpeg.image.size == (100, 100)
+        h, w, strips = IngestedImage(encode(rgb, 'JPEG')).gray_strips(rows=64)
+        assert (h, w) == (100, 100) and sum(strip.shape[0] for strip in strips) == 100
+        try:
+            IngestedImage(encode(rgb, 'PNG')).open()
+            raise AssertionError("Expected the decode budget to reject a large PNG")
+        except UploadTooLarge:
+            pass
+        # The budget is in bytes, so a grayscale PNG may have 3x the pixels of an RGB one
+        gray = np.random.randint(0, 255, (150, 200), dtype=np.uint8)
+        assert IngestedImage(encode(gray, 'PNG')).grayscale().shape == (150, 200)
+    finally:
+        ingestion.MAX_DECODE_BYTES = previous
+
+def test_large_grayscale_png():
+    print("Analyzing a 10000x10000 grayscale PNG through the tiled path...")
+    gray = np.zeros((10000, 10000), dtype=np.uint8)
+    gray[::7, :] = 200
+    with temporary_database():
+        result = predict_image(encode(gray, 'PNG'))
+    print(f"Result: {result['modality']} / {result['condition']}")
+    assert result['condition'] != "Analysis Error" and result['confidence'] > 0
+
+def test_streaming_upload_limits():
+    print("Streaming an upload with incremental hashing and a byte budget...")
+    data = encode(np.zeros((64, 64), dtype=np.uint8), 'PNG')
+
+    async def run(max_bytes):
+        return await read_upload(UploadFile(io.BytesIO(data), filename="scan.png"), max_bytes=max_bytes)
+
+    ingested = asyncio.run(run(1 << 20))
+    assert ingested.digest == IngestedImage(data).digest
+    try:
+        asyncio.run(run(16))
+        raise AssertionError("Expected the byte budget to reject the upload")
+    except UploadTooLarge:
+        pass
+    print("Ingestion test successful!")
+
+if __name__ == "__main__":
+    test_decode_once_parity()
+    test_jpeg_draft_decode()
+    test_tiled_strips()
+    test_decode_pixel_budget()
+    test_large_grayscale_png()
+    test_streaming_upload_limits()
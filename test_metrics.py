@@ -0,0 +1,24 @@
+import metrics
+
+def test_prometheus_rendering():
+    print("Recording stage timings and rendering Prometheus text...")
+    metrics.get_histogram("test_stage_seconds", stage="decode").observe(0.003)
+    metrics.get_histogram("test_stage_seconds", stage="decode").observe(2.0)
+    metrics.set_gauge("test_in_flight", 3)
+    metrics.inc_counter("test_events_total", kind="a")
+    metrics.inc_counter("test_events_total", 2, kind="a")
+    text = metrics.render_prometheus()
+    assert '# TYPE test_stage_seconds histogram' in text
+    assert 'test_stage_seconds_bucket{stage="decode",le="0.005"} 1' in text
+    assert 'test_stage_seconds_bucket{stage="decode",le="+Inf"} 2' in text
+    assert 'test_stage_seconds_count{stage="decode"} 2' in text
+    assert 'test_in_flight 3.0' in text
+    assert '# TYPE test_events_total counter' in text and 'test_events_total{kind="a"} 3.0' in text
+
+    timer = metrics.stage_timer("test_request_seconds")
+    timer.mark("ingest")
+    assert 'test_request_seconds_count{stage="ingest"} 1' in metrics.render_prometheus()
+    print("Metrics test successful!")
+
+if __name__ == "__main__":
+    test_prometheus_rendering()
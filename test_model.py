@@ -1,5 +1,18 @@
+import os
+import subprocess
+import sys
+import tempfile
 import torch
 from ensemble_model import MedicalEnsemble
+from model_registry import ModelRegistry, SharedBackbones, ModalityEnsemble, _module_mb
+from inference_modes import compare_modes, apply_execution_mode
+from export_model import export_torchscript, export_onnx
+from inference_backends import TorchScriptBackend, OnnxBackend
+from checkpoints import save_checkpoint
+from uncertainty import VIEW_TRANSFORMS, tta_views, summarize_views
+from ensemble_model import apply_neural_outputs
+from cascade import CASCADE_ORDER, run_cascade, simulate_cascade, evaluate_cascade, is_confident
+from heuristics import MEMBER_NAMES
 
 def test_ensemble():
     print("Initializing ensemble model (8 classes)...")
@@ -21,5 +34,200 @@ def test_ensemble():
     
     print("Ensemble test successful!")
 
+def test_shared_registry():
+    print("Loading shared backbones with chest and bone heads...")
+    registry = ModelRegistry({"chest": list(range(8)), "bone": list(range(7))}, weights_dir=None, pretrained=False)
+    chest = registry.get_ensemble("chest")
+    bone = registry.get_ensemble("bone")
+    assert chest.backbones is bone.backbones
+
+    final_prob, individual_probs = chest(torch.randn(2, 3, 224, 224))
+    print(f"Chest head output shape: {final_prob.shape}")
+    assert final_prob.shape == (2, 8) and len(individual_probs) == 3
+
+    report = registry.memory_report()
+    print(f"Memory report: {report}")
+    assert set(report['heads_mb']) == {"chest", "bone"}
+    assert report['untrained_heads'] == ["bone", "chest"]
+    print("Shared registry test successful!")
+
+def test_offline_checkpoint():
+    with tempfile.TemporaryDirectory() as weights_dir:
+        print("Writing a consolidated checkpoint with a trained chest head...")
+        backbones = SharedBackbones(pretrained=False)
+        state = {f"backbones.{k}": v for k, v in backbones.state_dict().items()}
+        heads = torch.nn.ModuleList([torch.nn.Linear(dim, 8) for dim in backbones.feature_dims])
+        state.update({f"heads.chest.{k}": v for k, v in heads.state_dict().items()})
+        save_checkpoint(state, weights_dir, heads={"chest": list(range(8))})
+
+        print("Loading registry from the local checkpoint (no network)...")
+        registry = ModelRegistry({"chest": list(range(8))}, weights_dir=weights_dir)
+        chest = registry.get_ensemble("chest")
+        assert registry.load_info['source'] == "checkpoint"
+        assert torch.equal(chest.heads[0].weight, heads[0].weight)
+        assert registry.untrained_heads == set()
+
+        x = torch.randn(1, 3, 224, 224)
+        backbones.eval()
+        with torch.no_grad():
+            expected = torch.sigmoid(heads[0](backbones(x)[0]))
+        _, individual_probs = chest(x)
+        assert torch.allclose(individual_probs[0], expected, atol=1e-5)
+        print(f"Load info: {registry.load_info}")
+        print("Offline checkpoint test successful!")
+
+def test_execution_modes():
+    print("Comparing fp32, int8 and channels_last execution modes...")
+    ensemble = ModalityEnsemble(SharedBackbones(pretrained=False), num_classes=8)
+    report = compare_modes(ensemble, torch.randn(2, 3, 224, 224), tolerance=0.05, repeats=1)
+    for mode, stats in report['modes'].items():
+        print(f"{mode}: {stats}")
+    assert report['modes']['fp32']['max_abs_delta'] == 0.0
+    assert report['modes']['channels_last']['max_abs_delta'] < 1e-3
+    assert report['recommended'] in report['modes']
+
+    print("Checking that int8 and channels_last keep checkpoint-backed conv weights...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "small.pt")
+        module = torch.nn.Sequential(torch.nn.Conv2d(3, 8, 3), torch.nn.Flatten(), torch.nn.Linear(8 * 6 * 6, 4))
+        torch.save(module.to(memory_format=torch.channels_last).state_dict(), path)
+        state = torch.load(path, mmap=True, weights_only=True)
+        for mode in ("int8", "channels_last"):
+            loaded = torch.nn.Sequential(torch.nn.Conv2d(3, 8, 3), torch.nn.Flatten(), torch.nn.Linear(8 * 6 * 6, 4))
+            loaded.load_state_dict(state, assign=True)
+            loaded = apply_execution_mode(loaded, mode)
+            assert loaded[0].weight.data_ptr() == state['0.weight'].data_ptr(), mode
+        # Packed int8 Linear weights are not parameters() but still count towards the reported size
+        quantized = apply_execution_mode(module, "int8")
+        assert _module_mb(quantized) > sum(p.numel() * p.element_size() for p in quantized.parameters()) / (1024 * 1024)
+    print("Execution mode test successful!")
+
+def test_parallel_members():
+    print("Comparing sequential and threaded member execution...")
+    backbones = SharedBackbones(pretrained=False)
+    sequential = ModalityEnsemble(backbones, num_classes=8, parallelism="sequential")
+    threaded = ModalityEnsemble(backbones, num_classes=8, parallelism="threads")
+    threaded.heads.load_state_dict(sequential.heads.state_dict())
+
+    x = torch.randn(2, 3, 224, 224)
+    expected_avg, _ = sequential(x)
+    avg_output, individual_outputs = threaded(x)
+    assert torch.allclose(avg_output, expected_avg, atol=1e-6) and len(individual_outputs) == 3
+    print("Parallel member test successful!")
+
+def test_compiled_backends():
+    ensemble = ModalityEnsemble(SharedBackbones(pretrained=False), num_classes=8)
+    x = torch.randn(2, 3, 224, 224)
+    expected_avg, expected_individual = ensemble(x)
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        print("Exporting fused ensemble to TorchScript...")
+        backend = TorchScriptBackend(export_torchscript(ensemble, os.path.join(export_dir, "chest.ts")))
+        avg_output, individual_outputs = backend(x)
+        assert torch.allclose(avg_output, expected_avg, atol=1e-5)
+        assert torch.allclose(individual_outputs, torch.stack(expected_individual), atol=1e-5)
+
+        try:
+            import onnxruntime
+        except ImportError:
+            print("onnxruntime not installed, skipping ONNX parity check.")
+            return
+        print("Exporting fused ensemble to ONNX...")
+        backend = OnnxBackend(export_onnx(ensemble, os.path.join(export_dir, "chest.onnx")))
+        avg_output, individual_outputs = backend(x.numpy())
+        assert torch.allclose(torch.from_numpy(avg_output), expected_avg, atol=1e-4)
+        assert torch.allclose(torch.from_numpy(individual_outputs), torch.stack(expected_individual), atol=1e-4)
+
+        print("Serving the ONNX export in a fresh interpreter without torch...")
+        env = dict(os.environ, NEURAL_ENSEMBLE="1", INFERENCE_BACKEND="onnx", MODEL_EXPORT_DIR=export_dir,
+                   MEDICAL_DB_PATH=os.path.join(export_dir, "test.db"))
+        proc = subprocess.run([sys.executable, "-c", _SERVE_ONNX], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              env=env, capture_output=True, text=True)
+        assert proc.returncode == 0, proc.stderr
+    print("Compiled backend parity test successful!")
+
+# Runs the compiled chest head through neural.load() the way /predict does
+_SERVE_ONNX = """
+import io, sys
+import numpy as np
+from PIL import Image
+import neural
+from diagnosis import predict_image
+buffer = io.BytesIO()
+Image.fromarray(np.random.randint(0, 255, (256, 256), dtype=np.uint8)).save(buffer, format="PNG")
+result = predict_image(buffer.getvalue())
+result["modality"] = "Chest X-ray"
+module = neural.load()
+assert module.__name__ == "onnx_model" and module.preload_backends() == ["chest"], module
+image = neural.prepare_image(buffer.getvalue())
+[outputs] = neural.run_ensemble_batch([(neural.get_ensemble_for_modality("Chest X-ray"), image)])
+neural.apply_neural_outputs(result, *outputs)
+assert len(result["ensemble_breakdown"]) == 3, result["ensemble_breakdown"]
+assert "torch" not in sys.modules, "ONNX serving imported torch"
+"""
+
+def test_tta_uncertainty():
+    print("Computing 4-view TTA uncertainty in one batched pass...")
+    ensemble = ModalityEnsemble(SharedBackbones(pretrained=False), num_classes=5)
+    x = torch.randn(2, 3, 224, 224)
+    calls = []
+    forward = ensemble.forward
+    ensemble.forward = lambda inputs: calls.append(inputs.shape[0]) or forward(inputs)
+    _, individual = ensemble(tta_views(x, 4))
+    stats = summarize_views(individual, 4)
+    assert calls == [8]
+
+    print("Comparing against separate per-view forward passes...")
+    per_view = torch.stack([torch.stack(forward(transform(x))[1]) for transform in VIEW_TRANSFORMS[:4]], dim=1)
+    assert torch.allclose(stats["member_mean"], per_view.mean(dim=1), atol=1e-5)
+    assert torch.allclose(stats["member_variance"], per_view.var(dim=1, unbiased=False), atol=1e-6)
+    assert torch.allclose(stats["mean"], per_view.mean(dim=(0, 1)), atol=1e-5)
+    assert torch.allclose(stats["disagreement"], per_view.mean(dim=1).var(dim=0, unbiased=False), atol=1e-6)
+    assert torch.allclose(stats["variance"], per_view.reshape(12, 2, 5).var(dim=0, unbiased=False), atol=1e-6)
+
+    uncertainty = {"views": 4, "member_variance": stats["member_variance"][:, 0],
+                   "disagreement": stats["disagreement"][0], "variance": stats["variance"][0]}
+    result = apply_neural_outputs({"modality": "Brain MRI"}, stats["mean"][0], list(stats["member_mean"][:, 0]), uncertainty)
+    assert result["uncertainty"]["samples"] == 12 and "variance" in result["ensemble_breakdown"][0]
+    print(f"Uncertainty: {result['uncertainty']}")
+    print("TTA uncertainty test successful!")
+
+def test_early_exit_cascade():
+    print("Running the early-exit cascade on a mixed batch...")
+    torch.manual_seed(0)
+    ensemble = ModalityEnsemble(SharedBackbones(pretrained=False), num_classes=5)
+    with torch.no_grad():
+        # Untrained heads saturate the sigmoid; shrink them so margins differ between rows
+        for head in ensemble.heads:
+            head.weight.mul_(1e-3)
+    x = torch.randn(6, 3, 224, 224)
+    _, full = ensemble(x)
+    # Margin at the median of the first member so some rows exit early and some escalate
+    first, last = CASCADE_ORDER[0], CASCADE_ORDER[-1]
+    top2 = full[first].topk(2, dim=1).values
+    margin = float((top2[:, 0] - top2[:, 1]).median())
+    avg_output, individual, members_run = run_cascade(ensemble, x, CASCADE_ORDER, 0.0, margin)
+    expected_avg, expected_run = simulate_cascade(full, CASCADE_ORDER, 0.0, margin)
+    assert torch.equal(members_run, expected_run)
+    assert 1 in members_run.tolist() and members_run.max() > 1
+    assert torch.allclose(avg_output, expected_avg, atol=1e-5)
+    assert torch.isnan(individual[last][members_run < 3]).all()
+    assert not is_confident(full[0], 2.0, 0.0).any()
+
+    row = int((members_run == 1).nonzero()[0])
+    result = apply_neural_outputs({"modality": "Brain MRI"}, avg_output[row], [p[row] for p in individual], members_run=1)
+    assert result["cascade"]["exit"] == MEMBER_NAMES[first] and len(result["ensemble_breakdown"]) == 1
+    report = evaluate_cascade(full, order=[0, 1, 2])
+    assert report["points"][-1]["relative_compute"] <= 1.0 and any(p["pareto"] for p in report["points"])
+    print(f"Exits: {members_run.tolist()}")
+    print("Cascade test successful!")
+
 if __name__ == "__main__":
     test_ensemble()
+    test_shared_registry()
+    test_offline_checkpoint()
+    test_execution_modes()
+    test_parallel_members()
+    test_compiled_backends()
+    test_tta_uncertainty()
+    test_early_exit_cascade()
@@ -0,0 +1,115 @@
+import gc
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from process_stats import memory_breakdown, child_pids
+
+def test_copy_on_write_sharing():
+    if not hasattr(os, "fork") or not os.path.exists("/proc/self/smaps_rollup"):
+        print("Skipping: needs os.fork and /proc smaps_rollup")
+        return
+    print("Allocating 64 MB in the parent and forking a worker...")
+    weights = bytearray(os.urandom(64 * 1024 * 1024))
+    gc.freeze()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # Worker: touch the data read-only, then report its own memory split
+        checksum = sum(weights[::4096])
+        os.write(write_fd, json.dumps({"checksum": checksum, **memory_breakdown()}).encode())
+        os._exit(0)
+    try:
+        assert pid in child_pids(os.getpid())
+        os.close(write_fd)
+        report = json.loads(os.read(read_fd, 4096).decode())
+    finally:
+        os.waitpid(pid, 0)
+        gc.unfreeze()
+    print(f"Worker memory: {report}")
+    assert report["checksum"] == sum(weights[::4096])
+    assert report["shared_mb"] >= 60
+    assert report["private_mb"] < report["shared_mb"]
+    print("Copy-on-write sharing test successful!")
+
+# Serves main.app through prefork.serve in a fresh interpreter
+_SERVE = """
+import sys
+import main, prefork
+prefork.serve(main.app, "127.0.0.1", int(sys.argv[1]), workers=2)
+"""
+
+# Workers that raise on startup: the supervisor must report them and stop restarting
+_CRASH_LOOP = """
+import sys
+import main, prefork
+def crash(app, sock, threads):
+    raise RuntimeError("worker failed to start")
+prefork._run_worker = crash
+prefork.serve(main.app, "127.0.0.1", int(sys.argv[1]), workers=2)
+"""
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _serve_env(tmp, **overrides):
+    return dict(os.environ, NEURAL_ENSEMBLE="0", MEDICAL_DB_PATH=os.path.join(tmp, "test.db"), **overrides)
+
+def test_serve_shares_preloaded_memory():
+    if not hasattr(os, "fork") or not os.path.exists("/proc/self/smaps_rollup"):
+        print("Skipping: needs os.fork and /proc smaps_rollup")
+        return
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        print("Starting prefork.serve with 2 workers...")
+        proc = subprocess.Popen([sys.executable, "-c", _SERVE, str(port)], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                env=_serve_env(tmp), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats/workers", timeout=5) as response:
+                        report = json.loads(response.read())
+                    if len(report["workers"]) == 2:
+                        break
+                except OSError:
+                    pass
+                assert proc.poll() is None and time.monotonic() < deadline, "prefork server did not start"
+                time.sleep(0.2)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            output = proc.communicate(timeout=30)[0]
+    print(f"Worker memory: {report['workers']}")
+    assert report["supervisor"]["pid"] == proc.pid
+    assert report["pid"] in [worker["pid"] for worker in report["workers"]]
+    # The interpreter and modules imported before the fork stay shared copy-on-write
+    for worker in report["workers"]:
+        assert worker["shared_mb"] > worker["private_mb"], worker
+    assert proc.returncode == 0, output
+    print("Prefork serve test successful!")
+
+def test_crash_loop_gives_up():
+    if not hasattr(os, "fork"):
+        print("Skipping: needs os.fork")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        print("Starting prefork.serve with workers that crash on startup...")
+        env = _serve_env(tmp, PREFORK_RESTART_LIMIT="3", PREFORK_RESTART_BACKOFF_MAX="0.2")
+        proc = subprocess.run([sys.executable, "-c", _CRASH_LOOP, str(_free_port())], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              env=env, capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 1, proc.stdout + proc.stderr
+    assert "RuntimeError: worker failed to start" in proc.stderr
+    assert "exited with code 1" in proc.stdout and "giving up" in proc.stdout
+    print("Crash loop test successful!")
+
+if __name__ == "__main__":
+    test_copy_on_write_sharing()
+    test_serve_shares_preloaded_memory()
+    test_crash_loop_gives_up()
@@ -0,0 +1,51 @@
+import io
+import numpy as np
+import torch
+from PIL import Image
+from preprocessing import BatchBuffer, resize_uint8
+from ensemble_model import get_transform, prepare_image, run_ensemble_batch
+
+def encode(array):
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def test_buffer_parity():
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (300, 260, 3), dtype=np.uint8), rng.integers(0, 256, (512, 384), dtype=np.uint8)]
+    print("Comparing buffered preprocessing with the torchvision transform...")
+    expected = torch.stack([get_transform()(Image.fromarray(img).convert('RGB')) for img in images])
+    arrays = [prepare_image(encode(img)) for img in images]
+    assert arrays[0].shape == (224, 224, 3) and arrays[1].shape == (224, 224)
+
+    buffer = BatchBuffer(capacity=2)
+    for _ in range(3):
+        batch = buffer.fill(arrays)
+        assert torch.allclose(batch, expected, atol=1e-5)
+    assert buffer.allocations == 1
+    assert buffer.fill(arrays * 3).shape[0] == 6 and buffer.allocations == 2
+    # The numpy buffer feeding the torch-free ONNX path matches as well
+    assert np.allclose(BatchBuffer(capacity=2, numpy=True).fill(arrays), expected.numpy(), atol=1e-5)
+    print("Preprocessing parity test successful!")
+
+def test_grouped_batch():
+    class Recorder:
+        # Stand-in ensemble: returns each row's mean so outputs can be matched to inputs
+        def __call__(self, x):
+            means = x.mean(dim=(1, 2, 3))
+            return means, [means, means * 2, means * 3]
+
+    first, second = Recorder(), Recorder()
+    arrays = [resize_uint8(Image.new('L', (64, 64), color=c)) for c in (10, 200, 90)]
+    items = [(first, arrays[0]), (second, arrays[1]), (first, arrays[2])]
+    print("Running an interleaved batch across two ensembles...")
+    results = run_ensemble_batch(items)
+    for (_, array), (avg_output, individual, _, _) in zip(items, results):
+        expected = float(((torch.tensor(float(array[0, 0])) / 255 - torch.tensor([0.485, 0.456, 0.406])) / torch.tensor([0.229, 0.224, 0.225])).mean())
+        assert abs(float(avg_output) - expected) < 1e-4
+        assert abs(float(individual[2]) - 3 * expected) < 1e-4
+    print("Grouped batch test successful!")
+
+if __name__ == "__main__":
+    test_buffer_parity()
+    test_grouped_batch()
@@ -0,0 +1,34 @@
+import os
+import tempfile
+import time
+from result_cache import ResultCache
+from database import close_connections
+
+def test_lru_and_ttl():
+    print("Testing LRU eviction and TTL expiry...")
+    cache = ResultCache(max_entries=2, ttl=0.05, db_path="")
+    cache.put("a", {"condition": "Normal"})
+    cache.put("b", {"condition": "Fracture"})
+    assert cache.get("a")["condition"] == "Normal"
+    cache.put("c", {"condition": "Tumor"})
+    assert cache.get("b") is None
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    print(f"Cache stats: {stats}")
+    assert stats['hits'] == 1 and stats['evictions'] == 1 and stats['expirations'] == 1
+
+def test_disk_tier():
+    print("Testing on-disk cache tier...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "cache.db")
+        ResultCache(max_entries=4, ttl=60, db_path=db_path).put("k", {"report": {"severity": "Normal"}})
+        cache = ResultCache(max_entries=4, ttl=60, db_path=db_path)
+        assert cache.get("k") == {"report": {"severity": "Normal"}}
+        assert cache.stats()['disk_hits'] == 1
+        close_connections()
+    print("Result cache test successful!")
+
+if __name__ == "__main__":
+    test_lru_and_ttl()
+    test_disk_tier()
@@ -0,0 +1,53 @@
+import asyncio
+import io
+import sys
+import time
+import numpy as np
+from PIL import Image
+import neural
+from ingestion import IngestedImage
+from worker_pool import InferencePool, PoolSaturated
+
+def test_pool_backpressure():
+    async def run():
+        pool = InferencePool(kind="thread", workers=1, queue_limit=1)
+        tasks = [asyncio.ensure_future(pool.run(time.sleep, 0.05)) for _ in range(3)]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        stats = pool.stats()
+        pool.shutdown()
+        return results, stats
+
+    print("Submitting 3 jobs to a pool with 1 worker and a queue of 1...")
+    results, stats = asyncio.run(run())
+    rejected = [r for r in results if isinstance(r, PoolSaturated)]
+    print(f"Pool stats: {stats}")
+    assert len(rejected) == 1
+    assert stats['completed'] == 2
+    assert stats['rejected'] == 1
+    assert stats['max_wait_ms'] > 0
+    print("Backpressure test successful!")
+
+def _torch_imported():
+    return "torch" in sys.modules
+
+def test_process_pool_preprocessing():
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.randint(0, 255, (300, 200), dtype=np.uint8)).save(buffer, format="PNG")
+
+    async def run():
+        pool = InferencePool(kind="process", workers=1, queue_limit=1)
+        try:
+            image = await pool.run(neural.prepare_image, IngestedImage(buffer.getvalue()))
+            return image, await pool.run(_torch_imported)
+        finally:
+            pool.shutdown()
+
+    print("Preprocessing an upload in a process-pool worker...")
+    image, torch_imported = asyncio.run(run())
+    assert image.shape == (224, 224)
+    assert not torch_imported, "process-pool preprocessing imported torch"
+    print("Process pool test successful!")
+
+if __name__ == "__main__":
+    test_pool_backpressure()
+    test_process_pool_preprocessing()
@@ -0,0 +1,32 @@
+import contextlib
+import os
+import tempfile
+
+import database
+
+
+@contextlib.contextmanager
+def temporary_database(name="test.db", init=True, env=False):
+    """Points database.DB_PATH at a fresh SQLite file for the duration of the block.
+
+    Yields the path. env=True also exports MEDICAL_DB_PATH for worker processes.
+    Pooled connections are closed and the original path restored on exit.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, name)
+        original_path, original_env = database.DB_PATH, os.environ.get("MEDICAL_DB_PATH")
+        database.DB_PATH = path
+        if env:
+            os.environ["MEDICAL_DB_PATH"] = path
+        try:
+            if init:
+                database.init_db()
+            yield path
+        finally:
+            database.close_connections()
+            database.DB_PATH = original_path
+            if env:
+                if original_env is None:
+                    os.environ.pop("MEDICAL_DB_PATH", None)
+                else:
+                    os.environ["MEDICAL_DB_PATH"] = original_env
@@ -0,0 +1,60 @@
+import torch
+import torch.nn.functional as F
+
+# Test-time augmentation: UNCERTAINTY_VIEWS views per image (1 disables uncertainty estimation)
+from neural import UNCERTAINTY_VIEWS
+
+CROP_FRACTION = 0.9
+
+
+def _crop(x, top, left):
+    # Crops CROP_FRACTION of the frame at a relative offset and resizes back to the input size
+    h, w = x.shape[-2:]
+    ch, cw = int(h * CROP_FRACTION), int(w * CROP_FRACTION)
+    y0, x0 = int((h - ch) * top), int((w - cw) * left)
+    crop = x[..., y0:y0 + ch, x0:x0 + cw]
+    return F.interpolate(crop, size=(h, w), mode="bilinear", align_corners=False)
+
+
+# Deterministic view order; the first K are used
+VIEW_TRANSFORMS = [
+    lambda x: x,
+    lambda x: torch.flip(x, dims=[-1]),
+    lambda x: _crop(x, 0.5, 0.5),
+    lambda x: torch.flip(_crop(x, 0.5, 0.5), dims=[-1]),
+    lambda x: _crop(x, 0.0, 0.0),
+    lambda x: _crop(x, 1.0, 1.0),
+    lambda x: _crop(x, 0.0, 1.0),
+    lambda x: _crop(x, 1.0, 0.0),
+]
+
+
+def tta_views(x, views=UNCERTAINTY_VIEWS):
+    """Stacks `views` augmented copies of a (B, 3, H, W) batch into one (views * B, 3, H, W) batch."""
+    if not 1 <= views <= len(VIEW_TRANSFORMS):
+        raise ValueError(f"UNCERTAINTY_VIEWS must be between 1 and {len(VIEW_TRANSFORMS)}, got {views}")
+    if views == 1:
+        return x
+    return torch.cat([transform(x) for transform in VIEW_TRANSFORMS[:views]])
+
+
+def summarize_views(individual_outputs, views):
+    """Reduces member outputs over a tta_views() batch to per-image statistics.
+
+    `individual_outputs` holds one (views * B, C) probability tensor per member. The
+    views x members samples are treated as one Monte Carlo ensemble. Returns mean
+    (B, C), per-member means over views (M, B, C), per-member variance across views
+    (M, B, C), inter-model disagreement, i.e. variance of the member means (B, C),
+    and total predictive variance over all samples (B, C).
+    """
+    probs = torch.stack(list(individual_outputs))
+    members, rows, classes = probs.shape
+    probs = probs.view(members, views, rows // views, classes)
+    member_mean = probs.mean(dim=1)
+    return {
+        "mean": member_mean.mean(dim=0),
+        "member_mean": member_mean,
+        "member_variance": probs.var(dim=1, unbiased=False),
+        "disagreement": member_mean.var(dim=0, unbiased=False),
+        "variance": probs.transpose(0, 1).reshape(members * views, -1, classes).var(dim=0, unbiased=False),
+    }
@@ -0,0 +1,85 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Inference executor settings: "thread" or "process", worker count and bounded admission queue
+INFERENCE_EXECUTOR = os.environ.get("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+INFERENCE_QUEUE_LIMIT = int(os.environ.get("INFERENCE_QUEUE_LIMIT", "16"))
+INFERENCE_RETRY_AFTER = int(os.environ.get("INFERENCE_RETRY_AFTER", "1"))
+# Process workers start from a clean interpreter rather than forking the server, which by then
+# runs the knowledge watcher and history writer threads (forkserver on Linux, spawn elsewhere)
+INFERENCE_PROCESS_START = os.environ.get(
+    "INFERENCE_PROCESS_START", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+class PoolSaturated(Exception):
+    """Raised when every worker is busy and the admission queue is full."""
+
+
+def _timed_call(fn, *args):
+    # Runs inside the worker; reports when execution actually started so queue wait can be measured
+    return time.time(), fn(*args)
+
+
+class InferencePool:
+    """Bounded executor for CPU-bound work, admitted from the asyncio event loop."""
+
+    def __init__(self, kind=INFERENCE_EXECUTOR, workers=INFERENCE_WORKERS, queue_limit=INFERENCE_QUEUE_LIMIT):
+        self.kind = kind
+        self.workers = max(1, int(workers))
+        self.queue_limit = max(0, int(queue_limit))
+        self._executor = None
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(INFERENCE_PROCESS_START))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        return self._executor
+
+    async def run(self, fn, *args):
+        # Admission control happens on the event loop thread, so plain counters are safe
+        if self._in_flight >= self.workers + self.queue_limit:
+            self.rejected += 1
+            raise PoolSaturated(f"Inference pool saturated ({self._in_flight} in flight)")
+
+        self._in_flight += 1
+        submitted = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            started, result = await loop.run_in_executor(self._get_executor(), _timed_call, fn, *args)
+            wait = max(0.0, started - submitted)
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self.completed += 1
+            return result
+        finally:
+            self._in_flight -= 1
+
+    def stats(self):
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self._in_flight,
+            "queue_depth": max(0, self._in_flight - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": (self._wait_total / self.completed * 1000.0) if self.completed else 0.0,
+            "max_wait_ms": self._wait_max * 1000.0,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None